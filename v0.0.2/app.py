@@ -29,6 +29,6 @@ class blaster(Application):
         self.blaster_payload = self.import_module("blaster")
         # self.logger.info('blaster payload imported.')
 
-        menu_callback = lambda: self.blaster_payload.blaster.show_dialog(self)
+        menu_callback = lambda: self.blaster_payload.show_dialog(self)
 
         self.engine.register_command("Blaster...", menu_callback)
\ No newline at end of file
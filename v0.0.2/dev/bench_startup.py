@@ -0,0 +1,73 @@
+# Copyright (c) 2013 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+Measures what loading the Blaster app adds to Maya's startup, and fails when it is over budget.
+
+    mayapy bench_startup.py --runs 20 --threshold-ms 5
+
+Each run imports the blaster package the way the app's init_app does, in a fresh interpreter, and times it.  The
+run also fails if the import pulled in the dialog, the Deadline API or Maya queries, which belong to the first time
+Blaster is opened.
+"""
+
+import os
+import sys
+import json
+import argparse
+import subprocess
+
+python_root = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'python')
+
+# Run in the child interpreter.  Prints the import time and any modules it should not have loaded.
+child = '''
+import sys, time, json
+sys.path.insert(0, %r)
+before = set(sys.modules)
+start = time.time()
+import blaster
+elapsed = time.time() - start
+loaded = set(sys.modules) - before
+unwanted = sorted([name for name in loaded if name in ('blaster.blaster', 'Deadline', 'maya', 'maya.cmds')
+                   or name.startswith('Deadline.') or name.startswith('blaster.ui')])
+print(json.dumps({'ms': elapsed * 1000.0, 'modules': len(loaded), 'unwanted': unwanted}))
+''' % python_root
+
+
+def measure(python=None):
+    output = subprocess.check_output([python, '-c', child])
+    return json.loads(output.decode('utf-8').strip().splitlines()[-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the cost of loading the Blaster app.')
+    parser.add_argument('--runs', type=int, default=20)
+    parser.add_argument('--threshold-ms', type=float, default=5.0, help='Most the import may take, median.')
+    parser.add_argument('--python', default=sys.executable, help='Interpreter to test, mayapy for real numbers.')
+    args = parser.parse_args(argv)
+
+    results = [measure(args.python) for _ in range(args.runs)]
+    times = sorted([result['ms'] for result in results])
+    median = times[len(times) // 2]
+    unwanted = sorted(set([name for result in results for name in result['unwanted']]))
+    print('import blaster: median=%.2fms min=%.2fms max=%.2fms modules=%i runs=%i' % (
+        median, times[0], times[-1], results[0]['modules'], args.runs))
+    failed = False
+    if unwanted:
+        print('FAIL: importing the app loaded %s' % ', '.join(unwanted))
+        failed = True
+    if median > args.threshold_ms:
+        print('FAIL: median %.2fms is over the %.2fms budget' % (median, args.threshold_ms))
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,256 @@
+# Copyright (c) 2013 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+Benchmarks Blaster's farm path against a Deadline web service, by default a stand-in started in process.
+
+    python bench_submission.py --core /path/to/tk-core/python --single 50 --bulk 200 --threads 8 --latency 0.05
+
+Jobs are built with Blaster's JobSpec and sent with JobSpec.submit, and pools are read with list_pools, so it's the
+app's own submission code being timed.  That needs Toolkit's core importable, from --core if it isn't already on
+the path.  Uses the Deadline Standalone API (Deadline.DeadlineConnect) like Blaster does when it can be imported,
+and a plain HTTP client speaking the same calls otherwise.
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+
+try:
+    from urllib2 import urlopen, Request
+except ImportError:
+    from urllib.request import urlopen, Request
+
+import deadline_standin
+
+
+class _Pools(object):
+    def __init__(self, connection):
+        self.connection = connection
+
+    def GetPoolNames(self):
+        return self.connection.request('/api/pools')
+
+
+class _Jobs(object):
+    def __init__(self, connection):
+        self.connection = connection
+
+    def SubmitJob(self, info, plugin, aux=[], idOnly=False):
+        return self.connection.request('/api/jobs', {'JobInfo': info, 'PluginInfo': plugin, 'AuxFiles': aux,
+                                                     'IdOnly': idOnly})
+
+    def GetJobs(self, ids=None):
+        return self.connection.request('/api/jobs?JobID=%s' % ','.join(ids or []))
+
+
+class _Tasks(object):
+    def __init__(self, connection):
+        self.connection = connection
+
+    def GetJobTasks(self, id=None):
+        return self.connection.request('/api/tasks?JobID=%s' % id)
+
+
+class HttpCon(object):
+    """
+    Minimal client with the same calls as DeadlineConnect.DeadlineCon, for machines without the Deadline API.
+    """
+
+    def __init__(self, host=None, port=None):
+        self.url = '%s:%s' % (host, port)
+        self.Pools = _Pools(self)
+        self.Jobs = _Jobs(self)
+        self.Tasks = _Tasks(self)
+
+    def request(self, path=None, body=None):
+        data = None
+        if body is not None:
+            data = json.dumps(body).encode('utf-8')
+        response = urlopen(Request(self.url + path, data=data, headers={'Content-Type': 'application/json'}))
+        return json.loads(response.read().decode('utf-8'))
+
+
+def connect(host=None, port=None):
+    try:
+        from Deadline import DeadlineConnect
+        return DeadlineConnect.DeadlineCon(host, port)
+    except ImportError:
+        return HttpCon(host, port)
+
+
+def blaster_job(index=0):
+    """
+    A job built the way submit_to_deadline builds one.
+    """
+    from blaster.deadline_job import JobSpec
+    job = JobSpec(name='bench_%04d' % index)
+    job.set_job('UserName', 'bench')
+    job.set_job('Region', 'none')
+    job.set_job('Comment', 'Blaster is shooting Greedo...')
+    job.set_job('Group', 'draftgrp')
+    job.set_job('Frames', '1001-1100')
+    job.set_job('Pool', 'playblasts')
+    job.set_job('Priority', 65)
+    job.set_job('Blacklist', False)
+    job.set_job('MachineLimit', 5)
+    for key in range(6):
+        job.set_extra_info(key, 'value')
+    job.add_extra_info_key_values([('Key%s' % key, 'value') for key in range(22)])
+    job.set_job('OutputDirectory0', '/tmp/bench')
+    job.set_job('OutputFilename0', 'bench_%04d.####.jpg' % index)
+    job.set_plugin('Executable', 'mayabatch')
+    job.set_plugin('Arguments', '-script "/tmp/blaster_0123456789ab.mel" '
+                                '-command "blaster_0123456789ab <STARTFRAME> <ENDFRAME>"')
+    job.set_plugin('StartupDirectory', '')
+    job.set_plugin('ShellExecute', False)
+    job.set_plugin('Shell', 'default')
+    return job
+
+
+def percentile(samples=None, fraction=None):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def timed(call=None):
+    start = time.time()
+    try:
+        call()
+        return time.time() - start, True
+    except Exception:
+        return time.time() - start, False
+
+
+def report(name=None, samples=None, failures=0, wall=None):
+    line = '%-10s n=%-5i p50=%7.1fms p95=%7.1fms max=%7.1fms failures=%i' % (
+        name, len(samples), percentile(samples, 0.5) * 1000, percentile(samples, 0.95) * 1000,
+        max(samples) * 1000, failures)
+    if wall:
+        line += ' throughput=%.1f/s' % (len(samples) / wall)
+    print(line)
+
+
+def bench_single(dl=None, count=None):
+    samples = []
+    failures = 0
+    for index in range(count):
+        job = blaster_job(index)
+        elapsed, ok = timed(lambda: job.submit(dl))
+        samples.append(elapsed)
+        failures += 0 if ok else 1
+    report('single', samples, failures)
+
+
+def bench_bulk(dl=None, count=None, threads=None):
+    samples = []
+    failures = [0]
+    lock = threading.Lock()
+    indices = list(range(count))
+
+    def worker():
+        while True:
+            with lock:
+                if not indices:
+                    return
+                index = indices.pop()
+            job = blaster_job(index)
+            elapsed, ok = timed(lambda: job.submit(dl))
+            with lock:
+                samples.append(elapsed)
+                failures[0] += 0 if ok else 1
+
+    start = time.time()
+    pool = [threading.Thread(target=worker) for _ in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    report('bulk', samples, failures[0], wall=time.time() - start)
+
+
+def bench_reads(dl=None, count=None, jobs=10, attempts=100):
+    from blaster.deadline_job import list_pools
+    pools = []
+    status = []
+    pool_failures = 0
+    status_failures = 0
+    ids = []
+    for attempt in range(attempts):
+        if len(ids) == jobs:
+            break
+        try:
+            ids.append(blaster_job(len(ids)).submit(dl))
+        except Exception:
+            pass
+    if not ids:
+        print('reads      skipped, no job could be submitted in %i attempts' % attempts)
+        return
+    for _ in range(count):
+        # list_pools hides failures behind an empty list, the way the dialog sees them.
+        start = time.time()
+        ok = bool(list_pools(dl))
+        pools.append(time.time() - start)
+        pool_failures += 0 if ok else 1
+        # One query for every watched job, the way the job monitor polls.
+        elapsed, ok = timed(lambda: dl.Jobs.GetJobs(ids))
+        status.append(elapsed)
+        status_failures += 0 if ok else 1
+    report('pools', pools, pool_failures)
+    report('status', status, status_failures)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark Blaster submissions against the Deadline web service.')
+    parser.add_argument('--host', default=None, help='Web service to hit.  Starts a local stand-in if not given.')
+    parser.add_argument('--port', type=int, default=8082)
+    parser.add_argument('--single', type=int, default=50, help='Sequential submissions.')
+    parser.add_argument('--bulk', type=int, default=200, help='Concurrent submissions.')
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--reads', type=int, default=50, help='Pool and status queries.')
+    parser.add_argument('--latency', type=float, default=0.0, help='Stand-in latency, in seconds.')
+    parser.add_argument('--failure-rate', type=float, default=0.0, help='Stand-in failure rate.')
+    parser.add_argument('--core', default=None, help="Toolkit core's python folder, if sgtk isn't importable.")
+    args = parser.parse_args(argv)
+
+    if args.core:
+        sys.path.insert(0, args.core)
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'python'))
+    try:
+        import blaster.deadline_job
+    except ImportError as e:
+        print('Blaster needs Toolkit core to be importable, pass --core: %s' % e)
+        return 2
+
+    host = args.host
+    server = None
+    if not host:
+        server = deadline_standin.make_server(port=args.port, latency=args.latency, failure_rate=args.failure_rate)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        host = 'http://127.0.0.1'
+    dl = connect(host, args.port)
+    print('Benchmarking %s:%s with %s' % (host, args.port, dl.__class__.__name__))
+    try:
+        bench_single(dl, args.single)
+        bench_bulk(dl, args.bulk, args.threads)
+        bench_reads(dl, args.reads)
+    finally:
+        if server:
+            server.shutdown()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,73 @@
+# Copyright (c) 2013 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+Checks Blaster's Shotgun metrics files against a call budget, and summarizes them.
+
+    python check_shotgun_budget.py <cache location>/metrics/*.json --budget find_one=5 create=0 batch=2
+
+Exits non-zero if any run went over budget, so it can gate a build.  Without --budget, the budget each run was
+made with is used.
+
+tests/test_shotgun_budget.py holds the dialog's own Shotgun code to the budget in info.yml against a fake
+connection, this checks what real runs did.
+"""
+
+import sys
+import json
+import argparse
+
+
+def parse_budget(values=None):
+    budget = {}
+    for value in values or []:
+        method, _, calls = value.partition('=')
+        budget[method] = int(calls)
+    return budget
+
+
+def check(path=None, budget=None):
+    with open(path) as metrics:
+        report = json.load(metrics)
+    budget = budget or report.get('budget', {})
+    failures = []
+    print('%s (%.1fs)' % (path, report.get('duration', 0)))
+    for method, stats in sorted(report['methods'].items()):
+        mean = stats['total_ms'] / stats['calls'] if stats['calls'] else 0
+        allowed = budget.get(method)
+        line = '  %-28s calls=%-4i mean=%7.1fms max=%7.1fms sent=%-9i received=%-9i' % (
+            method, stats['calls'], mean, stats['max_ms'], stats['bytes_sent'], stats['bytes_received'])
+        if allowed is not None:
+            line += ' budget=%i' % allowed
+            if stats['calls'] > allowed:
+                line += ' OVER'
+                failures.append(method)
+        print(line)
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Check Blaster Shotgun metrics against a call budget.')
+    parser.add_argument('metrics', nargs='+', help='Metrics files written by Blaster.')
+    parser.add_argument('--budget', nargs='*', help='method=calls pairs.')
+    args = parser.parse_args(argv)
+    budget = parse_budget(args.budget)
+    over = 0
+    for path in args.metrics:
+        if check(path, budget):
+            over += 1
+    if over:
+        print('%i of %i runs over budget.' % (over, len(args.metrics)))
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
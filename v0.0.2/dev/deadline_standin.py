@@ -0,0 +1,268 @@
+# Copyright (c) 2013 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+Local stand-in for the Deadline web service.
+
+Implements the part of the REST API Blaster uses: pool names, job submission, and job and task status.  Submitted
+jobs "render" on a clock, so the job monitor and farm history see them move through Pending, Active and Completed.
+
+    python deadline_standin.py --port 8082 --latency 0.05 --failure-rate 0.02
+
+Then point the deadline_connection setting at http://localhost.
+"""
+
+import re
+import sys
+import json
+import math
+import time
+import random
+import argparse
+import threading
+
+try:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+    from urlparse import urlparse, parse_qs
+except ImportError:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+    from urllib.parse import urlparse, parse_qs
+
+
+def frame_list(frames=None):
+    """
+    Expands a Deadline frame list, ie. 1001-1064 or 1,5,10-20x2, to its frames in order.
+    """
+    expanded = []
+    for chunk in ('%s' % frames).split(','):
+        match = re.match(r'^\s*(-?\d+)(?:\s*-\s*(-?\d+))?(?:\s*[xX:](\d+))?\s*$', chunk)
+        if not match:
+            continue
+        first = int(match.group(1))
+        last = int(match.group(2) or first)
+        step = int(match.group(3) or 1) * (1 if last >= first else -1)
+        expanded += range(first, last + step, step)
+    return expanded or [1]
+
+
+class Farm(object):
+    """
+    Fake farm state.  Jobs wait in the queue for queue_time, then render their tasks frame_time per frame, machine
+    limit tasks at a time.
+    """
+
+    def __init__(self, pools=None, queue_time=2.0, frame_time=0.1):
+        self.pools = pools
+        self.queue_time = queue_time
+        self.frame_time = frame_time
+        self.jobs = {}
+        self._lock = threading.Lock()
+        self._count = 0
+
+    def submit(self, job_info=None, plugin_info=None, aux_files=None):
+        with self._lock:
+            self._count += 1
+            job_id = '%024x' % (int(time.time() * 1000) * 1000000 + self._count)
+            frames = frame_list(job_info.get('Frames', '1'))
+            count = len(frames)
+            chunk = int(job_info.get('ChunkSize') or 1)
+            self.jobs[job_id] = {
+                'id': job_id,
+                'submitted': time.time(),
+                'frame_list': frames,
+                'frames': count,
+                'chunk': chunk,
+                'tasks': int(math.ceil(float(count) / chunk)),
+                'machine_limit': int(job_info.get('MachineLimit') or 0) or 1000,
+                'job_info': job_info,
+                'plugin_info': plugin_info,
+                'aux_files': aux_files or []
+            }
+        return job_id
+
+    def document(self, job_id=None):
+        job = self.jobs.get(job_id)
+        if job is None:
+            return None
+        info = job['job_info']
+        now = time.time()
+        started = job['submitted'] + self.queue_time
+        task_time = job['chunk'] * self.frame_time
+        machines = min(job['machine_limit'], job['tasks'])
+        completed = 0
+        rendering = 0
+        if now >= started:
+            elapsed = now - started
+            completed = min(job['tasks'], int(elapsed / task_time) * machines)
+            rendering = min(machines, job['tasks'] - completed)
+        if completed == job['tasks']:
+            stat = 3
+        elif now >= started:
+            stat = 1
+        else:
+            stat = 6
+        extra = {}
+        for key, value in info.items():
+            if key.startswith('ExtraInfoKeyValue') and '=' in value:
+                name, _, val = value.partition('=')
+                extra[name] = val
+        waves = int(math.ceil(float(job['tasks']) / machines))
+        return {
+            '_id': job_id,
+            'Stat': stat,
+            'CompletedChunks': completed,
+            'RenderingChunks': rendering,
+            'QueuedChunks': job['tasks'] - completed - rendering,
+            'FailedChunks': 0,
+            'Errs': 0,
+            'Date': stamp(job['submitted']),
+            'DateStart': stamp(started) if now >= started else '',
+            'DateComp': stamp(started + waves * task_time) if stat == 3 else '',
+            'Props': {
+                'Name': info.get('Name'),
+                'User': info.get('UserName'),
+                'Frames': info.get('Frames'),
+                'Chunk': job['chunk'],
+                'Tasks': job['tasks'],
+                'Pool': info.get('Pool'),
+                'Grp': info.get('Group'),
+                'Pri': int(info.get('Priority') or 50),
+                'MachLmt': int(info.get('MachineLimit') or 0),
+                'Plug': info.get('Plugin'),
+                'ExDic': extra
+            }
+        }
+
+    def tasks(self, job_id=None):
+        doc = self.document(job_id)
+        if doc is None:
+            return None
+        job = self.jobs[job_id]
+        task_time = job['chunk'] * self.frame_time
+        started = job['submitted'] + self.queue_time
+        # Tasks render in waves of machine limit, so the ones rendering are this far into the current wave.
+        wave = ((time.time() - started) % task_time) / task_time if time.time() >= started else 0.0
+        tasks = []
+        for index in range(doc['Props']['Tasks']):
+            if index < doc['CompletedChunks']:
+                stat, progress = 5, 100
+            elif index < doc['CompletedChunks'] + doc['RenderingChunks']:
+                stat, progress = 4, int(wave * 100)
+            else:
+                stat, progress = 2, 0
+            frames = job['frame_list'][index * job['chunk']:(index + 1) * job['chunk']]
+            tasks.append({'TaskID': index, 'JobID': job_id, 'Stat': stat, 'Prog': '%i %%' % progress, 'Errs': 0,
+                          'Frames': ','.join([str(frame) for frame in frames])})
+        return tasks
+
+
+def stamp(seconds=None):
+    return time.strftime('%Y-%m-%dT%H:%M:%S.000Z', time.gmtime(seconds))
+
+
+class StandinHandler(BaseHTTPRequestHandler):
+    farm = None
+    latency = 0.0
+    failure_rate = 0.0
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, data=None, status=200):
+        body = json.dumps(data).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _injected(self):
+        if self.latency:
+            time.sleep(random.uniform(0.5, 1.5) * self.latency)
+        if self.failure_rate and random.random() < self.failure_rate:
+            self._reply('Error: injected failure', status=500)
+            return True
+        return False
+
+    def do_GET(self):
+        if self._injected():
+            return
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        if url.path == '/api/pools':
+            self._reply(self.farm.pools)
+        elif url.path == '/api/jobs':
+            ids = ','.join(query.get('JobID', [])).split(',')
+            if ids == ['']:
+                ids = list(self.farm.jobs.keys())
+            self._reply([doc for doc in [self.farm.document(i) for i in ids] if doc])
+        elif url.path == '/api/tasks':
+            tasks = self.farm.tasks(query.get('JobID', [''])[0])
+            if tasks is None:
+                self._reply('Error: job not found', status=404)
+                return
+            self._reply({'Tasks': tasks})
+        else:
+            self._reply('Error: unknown path %s' % url.path, status=404)
+
+    def do_POST(self):
+        if self._injected():
+            return
+        length = int(self.headers.get('Content-Length') or 0)
+        body = json.loads(self.rfile.read(length).decode('utf-8') or '{}')
+        if urlparse(self.path).path != '/api/jobs':
+            self._reply('Error: unknown path %s' % self.path, status=404)
+            return
+        job_id = self.farm.submit(body.get('JobInfo', {}), body.get('PluginInfo', {}), body.get('AuxFiles', []))
+        if body.get('IdOnly'):
+            self._reply({'_id': job_id})
+        else:
+            self._reply(self.farm.document(job_id))
+
+
+class StandinServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    # Bulk submissions open a lot of connections at once.
+    request_queue_size = 128
+
+
+def make_server(port=8082, latency=0.0, failure_rate=0.0, pools=None, queue_time=2.0, frame_time=0.1):
+    class Handler(StandinHandler):
+        pass
+    Handler.farm = Farm(pools=pools or ['none', 'playblasts', 'maya_vray'], queue_time=queue_time,
+                        frame_time=frame_time)
+    Handler.latency = latency
+    Handler.failure_rate = failure_rate
+    return StandinServer(('127.0.0.1', port), Handler)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Local stand-in for the Deadline web service.')
+    parser.add_argument('--port', type=int, default=8082)
+    parser.add_argument('--latency', type=float, default=0.0, help='Mean seconds added to every request.')
+    parser.add_argument('--failure-rate', type=float, default=0.0, help='Fraction of requests answered with 500.')
+    parser.add_argument('--queue-time', type=float, default=2.0, help='Seconds a job waits before rendering.')
+    parser.add_argument('--frame-time', type=float, default=0.1, help='Seconds each frame takes to render.')
+    parser.add_argument('--pools', default='none,playblasts,maya_vray')
+    args = parser.parse_args(argv)
+    server = make_server(port=args.port, latency=args.latency, failure_rate=args.failure_rate,
+                         pools=args.pools.split(','), queue_time=args.queue_time, frame_time=args.frame_time)
+    print('Deadline stand-in listening on http://127.0.0.1:%s' % args.port)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -8,4 +8,11 @@
 # agreement to the Shotgun Pipeline Toolkit Source Code License. All rights 
 # not expressly granted therein are reserved by Shotgun Software Inc.
 
-from . import blaster
+
+def show_dialog(app_instance):
+    """
+    Shows the main dialog.  The dialog and everything it uses are only imported the first time Blaster is opened,
+    so loading the app costs Maya nothing in sessions that never open it.
+    """
+    from . import blaster
+    return blaster.show_dialog(app_instance)
@@ -0,0 +1,119 @@
+# Copyright (c) 2013 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+import os
+import sgtk
+from maya import cmds
+
+logger = sgtk.platform.get_logger(__name__)
+
+geometry_types = ['mesh', 'nurbsSurface', 'subdiv', 'nurbsCurve']
+# Curves keyed against time.  Driven keys don't depend on the frame range.
+time_curve_types = ['animCurveTL', 'animCurveTA', 'animCurveTT', 'animCurveTU']
+
+
+def camera_nodes(camera=None):
+    """
+    Returns the camera transform and shape for either a camera transform or shape name.
+    """
+    if cmds.nodeType(camera) == 'camera':
+        shape = cmds.ls(camera, long=True)[0]
+        transform = cmds.listRelatives(shape, parent=True, fullPath=True)[0]
+    else:
+        transform = cmds.ls(camera, long=True)[0]
+        shape = cmds.listRelatives(transform, shapes=True, type='camera', fullPath=True)[0]
+    return transform, shape
+
+
+def collect_package_nodes(camera=None):
+    """
+    Collects everything a single camera needs to draw its view: the camera, its image planes, and all visible,
+    non-intermediate geometry.  Shaders, and therefor the file textures they use, come along with the export.
+    """
+    cam_transform, cam_shape = camera_nodes(camera)
+    nodes = [cam_transform]
+
+    image_planes = cmds.listConnections('%s.imagePlane' % cam_shape, source=True, destination=False) or []
+    for image_plane in image_planes:
+        if cmds.nodeType(image_plane) == 'imagePlane':
+            image_plane = cmds.listRelatives(image_plane, parent=True, fullPath=True)[0]
+        nodes.append(image_plane)
+
+    shapes = cmds.ls(type=geometry_types, noIntermediate=True, visible=True, long=True) or []
+    transforms = cmds.listRelatives(shapes, parent=True, fullPath=True) or []
+    for transform in transforms:
+        if transform not in nodes:
+            nodes.append(transform)
+    return nodes
+
+
+def trim_keys(start=None, end=None):
+    """
+    Cuts the keys outside the blast range from every time curve.  Keys are set on the range's first and last frame
+    first, so the curves hold the same values inside it.  Cycling curves are left whole, since the keys outside the
+    range are what they repeat.
+    """
+    trimmed = 0
+    for curve in cmds.ls(type=time_curve_types) or []:
+        if cmds.getAttr('%s.preInfinity' % curve) or cmds.getAttr('%s.postInfinity' % curve):
+            continue
+        times = cmds.keyframe(curve, q=True, timeChange=True) or []
+        if not [time for time in times if time < start or time > end]:
+            continue
+        cmds.setKeyframe(curve, insert=True, time=[start, end])
+        if min(times) < start:
+            cmds.cutKey(curve, time=(min(times), start - 0.001), clear=True)
+        if max(times) > end:
+            cmds.cutKey(curve, time=(end + 0.001, max(times)), clear=True)
+        trimmed += 1
+    return trimmed
+
+
+def build_blast_package(camera=None, package_root=None, package_name=None, frame_range=None):
+    """
+    Exports a trimmed copy of the open scene holding only what the camera needs, so farm workers don't have to
+    load every reference, cache and texture of the artist's scene just to draw one view.  With a frame range, the
+    package's keys are cut down to it.  The artist's scene is put back as it was afterwards.
+    :param camera: Camera transform or shape to blast through
+    :param package_root: Folder on fast shared storage to write the package into
+    :param package_name: File name for the package, without extension
+    :param frame_range: (start, end) of the blast
+    :return: The package path, or None if the export failed.
+    """
+    package_path = os.path.join(package_root, '%s.mb' % package_name).replace('\\', '/')
+
+    selection = cmds.ls(sl=True, long=True) or []
+    # Keys are trimmed in the open scene and undone once it is exported, so only with undo on.
+    trim = frame_range is not None and cmds.undoInfo(q=True, state=True)
+    if trim:
+        cmds.undoInfo(openChunk=True, chunkName='blasterPackage')
+    try:
+        if not os.path.exists(package_root):
+            os.makedirs(package_root)
+        nodes = collect_package_nodes(camera=camera)
+        logger.debug('Packaging %i nodes for %s' % (len(nodes), camera))
+        cmds.select(nodes, r=True, noExpand=True)
+        if trim:
+            logger.debug('Trimmed the keys of %i curves to %s-%s' % (trim_keys(*frame_range), frame_range[0],
+                                                                     frame_range[1]))
+        cmds.file(package_path, exportSelected=True, type='mayaBinary', force=True, preserveReferences=False,
+                  shader=True, channels=True, constructionHistory=True, constraints=True, expressions=True)
+    except Exception, e:
+        logger.error('Blast package failed, the full scene will be used. %s' % e)
+        package_path = None
+    finally:
+        if trim:
+            cmds.undoInfo(closeChunk=True)
+            cmds.undo()
+        if selection:
+            cmds.select(selection, r=True, noExpand=True)
+        else:
+            cmds.select(clear=True)
+    return package_path
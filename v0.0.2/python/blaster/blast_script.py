@@ -0,0 +1,216 @@
+# Copyright (c) 2013 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+import os
+import re
+import json
+import hashlib
+from collections import OrderedDict
+import sgtk
+
+logger = sgtk.platform.get_logger(__name__)
+
+model_editor_flags = ['da', 'ao', 'shadows', 'displayTextures', 'udm', 'fogging', 'displayLights', 'ca', 'lt', 'j',
+                      'imp', 'nurbsCurves', 'nurbsSurfaces', 'polymeshes', 'imagePlane', 'cameras', 'lights',
+                      'joints', 'locators', 'grid', 'hud', 'twoSidedLighting', 'backfaceCulling']
+playblast_flags = ['format', 'filename', 'sqt', 'cc', 'v', 'orn', 'os', 'fp', 'p', 'qlt', 'c', 'wh', 'fo']
+attr_pattern = re.compile(r'^[A-Za-z_][\w:|]*(\.[A-Za-z_]\w*(\[\d+\])?)+$')
+
+
+class BlastScriptError(Exception):
+    pass
+
+
+def hash_settings(settings=None):
+    """
+    Stable hash of a settings dictionary.
+    """
+    return hashlib.sha1(json.dumps(settings, sort_keys=True, default=str)).hexdigest()
+
+
+def mel_value(value=None):
+    if isinstance(value, bool):
+        return '1' if value else '0'
+    if isinstance(value, (int, long, float)):
+        return '%s' % value
+    if isinstance(value, basestring):
+        return '"%s"' % value.replace('\\', '/').replace('"', '\\"')
+    raise BlastScriptError('%r can not be written to MEL' % value)
+
+
+def python_call(code=None):
+    """
+    Wraps python code in a MEL python() call.
+    """
+    return 'python("%s")' % code.replace('\\', '\\\\').replace('"', '\\"')
+
+
+class BlastScript(object):
+    """
+    Compiles the farm blast into a single MEL script: open the scene (optionally through the worker's local file
+    cache), set the viewport up, playblast, and put the hardware globals back.
+
+    Settings are keyed on what they change, so setting the same flag twice keeps only the last value.  The script
+    defines one global proc named after its own hash, which the job calls with the task's frame range.
+    """
+
+    def __init__(self, scene_file=None):
+        self.scene_file = scene_file
+        self._model_editor = OrderedDict()
+        self._attrs = OrderedDict()
+        self._playblast = OrderedDict()
+        self.references = OrderedDict()
+        self.cache_root = None
+        self.cache_bytes = None
+        self.module_root = None
+
+    def localize(self, cache_root=None, cache_bytes=None, references=None, module_root=None):
+        """
+        Has the worker copy the scene and its top level references to a local cache before opening them.
+        :param cache_root: Cache folder on the worker's local disk
+        :param cache_bytes: Size limit of the cache
+        :param references: dict of reference node: file path
+        :param module_root: Folder the worker imports localize.py from.  Defaults to this module's folder.
+        """
+        self.cache_root = cache_root
+        self.cache_bytes = cache_bytes
+        self.module_root = module_root
+        self.references = OrderedDict(sorted((references or {}).items()))
+
+    def model_editor(self, panel=None, flag=None, value=None):
+        if flag not in model_editor_flags:
+            raise BlastScriptError('Unknown modelEditor flag: %s' % flag)
+        self._model_editor[(panel, flag)] = value
+
+    def set_attr(self, attr=None, value=None):
+        if not attr_pattern.match(attr):
+            raise BlastScriptError('Bad attribute name: %s' % attr)
+        self._attrs[attr] = value
+
+    def playblast(self, **flags):
+        for flag in flags:
+            if flag not in playblast_flags:
+                raise BlastScriptError('Unknown playblast flag: %s' % flag)
+        # Keyword order isn't stable, so always write the flags in the same order for the hash.
+        for flag in playblast_flags:
+            if flags.get(flag) is not None:
+                self._playblast[flag] = flags[flag]
+
+    def writes_movie(self):
+        """
+        A movie can't be written a chunk at a time, every task would overwrite the same file with its own frames.
+        """
+        return self._playblast.get('format') == 'qt'
+
+    def validate(self):
+        if not self.scene_file:
+            raise BlastScriptError('The blast script needs a scene file.')
+        if not self._playblast:
+            raise BlastScriptError('The blast script has no playblast.')
+        # Catch anything that can't be written before it reaches a worker.
+        for value in self._model_editor.values() + self._attrs.values() + self._playblast.values():
+            mel_value(value)
+
+    def proc_name(self):
+        return 'blaster_%s' % self.settings_hash()[:12]
+
+    def settings_hash(self):
+        return hash_settings({
+            'scene': self.scene_file,
+            'references': self.references.items(),
+            'cache': [self.cache_root, self.cache_bytes, self.module_root],
+            'model_editor': [[p, f, v] for (p, f), v in self._model_editor.items()],
+            'attrs': self._attrs.items(),
+            'playblast': self._playblast.items()
+        })
+
+    def compile(self):
+        self.validate()
+        lines = [
+            '// Blaster farm blast script',
+            '// settings hash: %s' % self.settings_hash(),
+            'global proc %s(int $start, int $end)' % self.proc_name(),
+            '{'
+        ]
+        lines += self._open_scene()
+        lines += [
+            '',
+            '    // Setup'
+        ]
+        restore = []
+        for index, (attr, value) in enumerate(self._attrs.items()):
+            lines.append('    float $blaster_%i = `getAttr %s`;' % (index, mel_value(attr)))
+            lines.append('    setAttr %s %s;' % (mel_value(attr), mel_value(value)))
+            restore.append('    setAttr %s $blaster_%i;' % (mel_value(attr), index))
+        for (panel, flag), value in self._model_editor.items():
+            lines.append('    modelEditor -e -%s %s %s;' % (flag, mel_value(value), panel))
+
+        playblast = ' '.join(['-%s %s' % (flag, mel_value(value)) for flag, value in self._playblast.items()])
+        lines += [
+            '',
+            '    // Playblast',
+            '    playblast %s -st $start -et $end;' % playblast,
+            '',
+            '    // Restore'
+        ]
+        if self.cache_root:
+            lines.append('    %s;' % python_call('_blaster_cache.release()'))
+        lines += restore
+        lines.append('}')
+        return '\n'.join(lines) + '\n'
+
+    def _open_scene(self):
+        if not self.cache_root:
+            return ['    file -f -o %s;' % mel_value(self.scene_file)]
+        # localize.py sits next to this module on the shared config, and needs nothing from Toolkit.  Paths go into
+        # the python code through repr(), so Windows backslashes aren't read as escapes.
+        module_dir = self.module_root or os.path.dirname(os.path.abspath(__file__)).replace('\\', '/')
+        lines = [
+            '    // Localize',
+            '    %s;' % python_call("import sys; sys.path.insert(0, %r); import localize; "
+                                  "_blaster_cache = localize.LocalCache(%r, %s)" % (module_dir, self.cache_root,
+                                                                                     self.cache_bytes)),
+            '    string $blaster_scene = %s;' % python_call("_blaster_cache.localize(%r)" % self.scene_file),
+        ]
+        if self.references:
+            # Top level references are loaded from the cache by hand, so the scene opens without them.
+            lines.append('    file -f -o -lrd "none" $blaster_scene;')
+            lines.append('    string $blaster_reference;')
+            for node, path in self.references.items():
+                lines.append('    $blaster_reference = %s;' % python_call("_blaster_cache.localize(%r)" % path))
+                lines.append('    file -loadReference %s $blaster_reference;' % mel_value(node))
+        else:
+            lines.append('    file -f -o $blaster_scene;')
+        return lines
+
+    def write(self, directory=None):
+        """
+        Writes the script out, once per settings hash.  Re-blasting the same settings reuses the existing file.
+        :return: The script path
+        """
+        script = self.compile()
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        script_path = os.path.join(directory, '%s.mel' % self.proc_name()).replace('\\', '/')
+        if os.path.exists(script_path):
+            logger.debug('Reusing blast script %s' % script_path)
+            return script_path
+        temp_path = '%s.tmp' % script_path
+        with open(temp_path, 'w') as mel:
+            mel.write(script)
+        os.rename(temp_path, script_path)
+        logger.debug('Blast script written to %s' % script_path)
+        return script_path
+
+    def arguments(self, script_path=None):
+        """
+        The mayabatch arguments that source the script and run it over the task's frames.
+        """
+        return '-script "%s" -command "%s <STARTFRAME> <ENDFRAME>"' % (script_path, self.proc_name())
@@ -19,11 +19,34 @@ from datetime import datetime
 from glob import glob
 import re
 import time
+import tempfile
 
 # by importing QT from sgtk rather than directly, we ensure that
 # the code will be compatible with both PySide and PyQt.
 from sgtk.platform.qt import QtCore, QtGui
 from .ui.blaster_ui import Ui_Form
+from .deadline_job import JobSpec, list_pools
+from .blast_package import build_blast_package
+from .job_monitor import get_job_monitor, summarize_job
+from .farm_history import get_farm_history
+from .blast_script import BlastScript, BlastScriptError, hash_settings
+from .warm_worker import client_arguments
+from .submission_index import SubmissionIndex
+from .sg_prefetch import ContextPrefetcher
+from .sg_cache import CachedShotgun
+from .sg_metrics import ShotgunMetrics
+from .upload_queue import get_upload_queue
+from .publish_batcher import PublishBatcher
+from .imaging import review_media, sequence_frames
+from .media_index import MediaIndex
+from .template_cache import get_template_cache
+from .staging import get_output_stager, scratch_directory
+from .preflight import estimate_size, preflight
+from .retention import RetentionPolicy
+from .sequence_index import frame_pattern, index_path, read_index, write_index
+from .verify import verify_sequence, warning_problems
+from .burnin import burnin_folder, burnin_sequence
+from .proxies import ProxyWriter, proxy_folder
 logger = sgtk.platform.get_logger(__name__)
 
 # ----------------------------------------------------------------------------------------------------------------------
@@ -43,21 +66,24 @@ else:
     computername = 'HOSTNAME'
 
 # ----------------------------------------------------------------------------------------------------------------------
-# Deadline Import and Setup
+# Deadline Setup
 # ----------------------------------------------------------------------------------------------------------------------
-if osSystem == 'Windows':
-    # This should go into the paths.yml perhaps.  Setup a series of universal paths, and then call them here.
-    python_path = 'C:\\Python27\\Lib\\site-packages'
-else:
-    python_path = '/Volumes/Applications/Python27/Lib/site-packages'
-sys.path.append(python_path)
+# Nothing here may touch Deadline, Shotgun or Maya.  The Deadline API is imported and connected when the dialog opens,
+# and Maya is only asked about itself when a farm job needs it.
 
 # Set group from Deadline groups & options
 group_name = 'draftgrp'
-executable = r'C:\Program Files\Autodesk\Maya%s\bin\mayabatch.exe' % cmds.about(q=True, v=True)
+_executable = None
+
 
-from Deadline import DeadlineConnect as connect
-dl = connect.DeadlineCon('http://deadline.asc-vfx.com', 8082)
+def mayabatch_executable():
+    """
+    Path to mayabatch for the running Maya version.
+    """
+    global _executable
+    if _executable is None:
+        _executable = r'C:\Program Files\Autodesk\Maya%s\bin\mayabatch.exe' % cmds.about(q=True, v=True)
+    return _executable
 
 
 def show_dialog(app_instance):
@@ -100,10 +126,6 @@ class AppDialog(QtGui.QWidget):
         engine = self._app.engine
         self.sg = engine.sgtk
 
-        # now load in the UI that was created in the UI designer
-        self.ui = Ui_Form()
-        self.ui.setupUi(self)
-
         # Shotgun and System Details
         self.ctx = self._app.context
         self.project = self.ctx.project
@@ -116,31 +138,28 @@ class AppDialog(QtGui.QWidget):
         self.entity = self.ctx.entity['name']
         self.entity_type = self.ctx.entity['type']
         self.id = self.ctx.entity['id']
-        filters = [
-            ['id', 'is', self.sg_user_id]
-        ]
-        fields = [
-            'email',
-            'login'
-        ]
-        find_username = self.sg.shotgun.find_one('HumanUser', filters, fields)
-        self.username = find_username['login']
-        self.email = find_username['email']
+
+        # Reads go through a cache shared by every Maya session on this machine.  Whatever reaches Shotgun is counted
+        # and timed.
+        self.metrics = ShotgunMetrics()
+        self.shotgun = CachedShotgun(connection=lambda: self.metrics.wrap(self.sg.shotgun),
+                                     path=os.path.join(self._app.cache_location, 'shotgun_cache.json'),
+                                     ttls=self._app.get_setting('shotgun_cache_ttls'))
+
+        # Get the user's login and the shot's frame range on the way while the rest of the dialog is built.
+        self.prefetch = ContextPrefetcher(connection=lambda: self.shotgun, user_id=self.sg_user_id,
+                                          entity_type=self.entity_type, entity_id=self.id).start()
+        self.prefetched = {}
+        self.frame_range = None
+        self.username = None
+        self.email = None
+
+        # now load in the UI that was created in the UI designer
+        self.ui = Ui_Form()
+        self.ui.setupUi(self)
 
         self.start_frame = cmds.playbackOptions(q=True, min=True)
         self.end_frame = cmds.playbackOptions(q=True, max=True)
-        if self.entity_type == 'Shot':
-            filters = [
-                ['id', 'is', self.id]
-            ]
-            fields = [
-                'sg_head_in',
-                'sg_tail_out'
-            ]
-            self.frame_range = self.sg.shotgun.find_one('Shot', filters, fields)
-            if self.frame_range['sg_head_in'] and self.frame_range['sg_tail_out']:
-                self.start_frame = self.frame_range['sg_head_in']
-                self.end_frame = self.frame_range['sg_tail_out']
 
         self.viewport_settings = {}
         self.hardware_settings = {}
@@ -178,13 +197,25 @@ class AppDialog(QtGui.QWidget):
         deadline_port = int(self._app.get_setting('deadline_port'))
         self.dl = connect.DeadlineCon(deadline_connection, deadline_port)
         logger.debug('Deadline Connection made!')
+        self.monitor = get_job_monitor(self.dl)
+        self.monitor.job_updated.connect(self.job_status)
+        self.history = get_farm_history(os.path.join(self._app.cache_location, 'farm_history.json'))
+        self.history.attach(self.monitor)
+        self.templates = get_template_cache(self.sg)
+        self.stager = get_output_stager()
+        self.submissions = SubmissionIndex(os.path.join(self._app.cache_location, 'submissions.json'))
+        self.uploads = get_upload_queue(path=os.path.join(self._app.cache_location, 'uploads.json'),
+                                        connection=lambda tk=self.sg, metrics=self.metrics: metrics.wrap(tk.shotgun),
+                                        workers=self._app.get_setting('upload_workers'),
+                                        media_index=MediaIndex(os.path.join(self._app.cache_location,
+                                                                            'media_index.json')))
+        self.uploads.upload_progress.connect(self.upload_status)
 
         file_path = cmds.file(q=True, sn=True)
         file_name = os.path.basename(file_path)
         base_name, ext = os.path.splitext(file_name)
         logger.info(file_path)
         self.ui.job_name.setText(base_name)
-        self.ui.user.setText(self.username)
 
         self.set_value()
         self.ui.quality_slider.valueChanged.connect(self.set_value)
@@ -209,36 +240,54 @@ class AppDialog(QtGui.QWidget):
                     index = self.ui.pool.findText(pool, QtCore.Qt.MatchFixedString)
                     if index >= 0:
                         self.ui.pool.setCurrentIndex(index)
-        
+
+        self.apply_prefetch()
+
         # via the self._app handle we can for example access:
         # - The engine, via self._app.engine
         # - A Shotgun API instance, via self._app.shotgun
         # - A tk API instance, via self._app.tk
 
     def list_deadline_pools(self):
-        try:
-            # pools = ['none', 'maya_vray', 'nuke', 'maya_redshift', 'houdini', 'alembics', 'arnold', 'caching']
-            logger.debug('Return Deadline pools.')
-            pools = dl.Pools.GetPoolNames()
-        except Exception:
-            pools = []
-        return pools
+        # pools = ['none', 'maya_vray', 'nuke', 'maya_redshift', 'houdini', 'alembics', 'arnold', 'caching']
+        logger.debug('Return Deadline pools.')
+        return list_pools(self.dl)
+
+    def apply_prefetch(self):
+        """
+        Fills the dialog in from the prefetched Shotgun records.
+        """
+        self.prefetched = self.prefetch.result()
+        user = self.prefetched.get('user')
+        if user:
+            self.username = user['login']
+            self.email = user['email']
+            self.ui.user.setText(self.username)
+        self.frame_range = self.prefetched.get('entity')
+        if self.frame_range and self.frame_range['sg_head_in'] and self.frame_range['sg_tail_out']:
+            self.start_frame = self.frame_range['sg_head_in']
+            self.end_frame = self.frame_range['sg_tail_out']
+            self.ui.start_frame.setValue(self.start_frame)
+            self.ui.end_frame.setValue(self.end_frame)
 
     def sg_sync(self):
-        # This doesn't work yet.  I have to get my head straight.  For whatever reason, I'm over thinking it.
-        if self.entity_type == 'Shot':
+        if self.entity_type != 'Shot':
+            return
+        range_data = self.frame_range
+        if not range_data:
             filters = [
                 ['id', 'is', self.id]
             ]
-        fields = [
-            'sg_head_in',
-            'sg_tail_out'
-        ]
-        range_data = self.sg.shotgun.find_one(self.entity_type, filters, fields)
+            fields = [
+                'sg_head_in',
+                'sg_tail_out'
+            ]
+            range_data = self.shotgun.find_one(self.entity_type, filters, fields)
         playblast_in = range_data['sg_head_in']
         playblast_out = range_data['sg_tail_out']
-        self.ui.start_frame.setValue(playblast_in)
-        self.ui.end_frame.setValue(playblast_out)
+        if playblast_in is not None and playblast_out is not None:
+            self.ui.start_frame.setValue(playblast_in)
+            self.ui.end_frame.setValue(playblast_out)
 
     def time_sync(self):
         tl_start = cmds.playbackOptions(q=True, min=True)
@@ -413,6 +462,19 @@ class AppDialog(QtGui.QWidget):
             cmds.setAttr("hardwareRenderingGlobals.multiSampleEnable", self.hardware_settings['multiSampleEnable'])
             cmds.setAttr("hardwareRenderingGlobals.motionBlurEnable", self.hardware_settings['motionBlurEnable'])
 
+    def job_status(self, summary=None):
+        rendering = [task for task in summary['tasks'] if task['status'] == 'Rendering']
+        message = 'Farm: %s %s - %s/%s tasks, %s errors' % (summary['name'], summary['status'], summary['completed'],
+                                                            summary['total'], summary['errors'])
+        if rendering:
+            message += ' - rendering %s' % ', '.join(['%s (%s%%)' % (task['frames'], task['progress'])
+                                                      for task in rendering])
+        self.ui.progress_label.setText(message)
+        self.ui.blaster_progress.setValue(summary['progress'])
+
+    def upload_status(self, item=None):
+        self.ui.progress_label.setText('Upload: %s %s - %s left' % (item['name'], item['status'], item['remaining']))
+
     def clear_current_settings(self):
         self.viewport_settings.clear()
         self.hardware_settings.clear()
@@ -421,6 +483,33 @@ class AppDialog(QtGui.QWidget):
         self.clear_current_settings()
         self.close()
 
+    def closeEvent(self, event):
+        stats = self.shotgun.stats()
+        logger.info('Shotgun cache: %i hits, %i misses (%.0f%%)' % (stats['hits'], stats['misses'],
+                                                                    stats['hit_rate'] * 100))
+        self.shotgun.flush()
+        metrics = self.metrics
+        metrics_root = os.path.join(self._app.cache_location, 'metrics')
+        budget = self._app.get_setting('shotgun_call_budget')
+
+        def write():
+            try:
+                logger.debug('Shotgun metrics written to %s' % metrics.write(metrics_root, budget=budget))
+            except (IOError, OSError), e:
+                logger.warning('Shotgun metrics could not be written: %s' % e)
+        # Written now, and again once this run's uploads are done, so closing with uploads left still counts them.
+        write()
+        if self.uploads.pending():
+            self.uploads.when_idle(write)
+        # The monitor and upload queue outlive the dialog, however it was closed.
+        for signal, slot in [(self.monitor.job_updated, self.job_status),
+                             (self.uploads.upload_progress, self.upload_status)]:
+            try:
+                signal.disconnect(slot)
+            except (RuntimeError, TypeError):
+                pass
+        QtGui.QWidget.closeEvent(self, event)
+
     def reset_display(self, viewport=None):
         # print self.modelEditor_settings
         for this in self.modelEditor_settings:
@@ -477,7 +566,9 @@ class AppDialog(QtGui.QWidget):
         self.ui.progress_label.setText('Loading Blaster...')
         self.ui.blaster_progress.setValue(4)
         logger.info('Loading Blaster...')
-        farm_string = ''
+        script = None
+        # Every Version this run creates goes to Shotgun in one batch.
+        self.publisher = PublishBatcher(shotgun=self.shotgun, uploads=self.uploads)
         if settings:
             self.ui.progress_label.setText('Setting the camera...')
             self.ui.blaster_progress.setValue(5)
@@ -493,6 +584,7 @@ class AppDialog(QtGui.QWidget):
                 self.ui.progress_label.setText('Farm Blaster engaged!')
                 logger.info('Farm Blaster engaged!')
                 build_string = True
+                script = BlastScript()
             else:
                 self.ui.blaster_progress.setValue(6)
                 self.ui.progress_label.setText('Local Blaster engaged!')
@@ -511,7 +603,8 @@ class AppDialog(QtGui.QWidget):
                 self.ui.progress_label.setText('Setting Smooth Shaded!')
                 logger.info('Setting Smooth Shaded!')
                 if build_string:
-                    farm_string += 'modelEditor -e -da "smoothShaded" -ao 0 %s;' % active_panel
+                    script.model_editor(active_panel, 'da', 'smoothShaded')
+                    script.model_editor(active_panel, 'ao', False)
                 else:
                     cmds.modelEditor(active_panel, e=True, da='smoothShaded', ao=False)
             else:
@@ -519,7 +612,8 @@ class AppDialog(QtGui.QWidget):
                 self.ui.progress_label.setText('Setting Wireframe!')
                 logger.info('Setting Wireframe!')
                 if build_string:
-                    farm_string += 'modelEditor -e -da "wireframe" -ao 0 %s;' % active_panel
+                    script.model_editor(active_panel, 'da', 'wireframe')
+                    script.model_editor(active_panel, 'ao', False)
                 else:
                     cmds.modelEditor(active_panel, e=True, da='wireframe', ao=False)
 
@@ -530,7 +624,7 @@ class AppDialog(QtGui.QWidget):
                 self.ui.progress_label.setText('Setting Cast Shadows on!')
                 logger.info('Setting Cast Shaddows on!')
                 if build_string:
-                    farm_string += 'modelEditor -e -shadows 1 %s;' % active_panel
+                    script.model_editor(active_panel, 'shadows', True)
                 else:
                     cmds.modelEditor(active_panel, e=True, shadows=True)
             else:
@@ -538,7 +632,7 @@ class AppDialog(QtGui.QWidget):
                 self.ui.progress_label.setText('Setting Cast Shadows off!')
                 logger.info('Setting Cast Shaddows off!')
                 if build_string:
-                    farm_string += 'modelEditor -e -shadows 0 %s;' % active_panel
+                    script.model_editor(active_panel, 'shadows', False)
                 else:
                     cmds.modelEditor(active_panel, e=True, shadows=False)
 
@@ -549,7 +643,7 @@ class AppDialog(QtGui.QWidget):
                 self.ui.progress_label.setText('Setting Textures on!')
                 logger.info('Setting Textures on!')
                 if build_string:
-                    farm_string += 'modelEditor -e -displayTextures 1 %s;' % active_panel
+                    script.model_editor(active_panel, 'displayTextures', True)
                 else:
                     cmds.modelEditor(active_panel, e=True, displayTextures=True)
             else:
@@ -557,7 +651,7 @@ class AppDialog(QtGui.QWidget):
                 self.ui.progress_label.setText('Setting Textures off!')
                 logger.info('Setting Textures off!')
                 if build_string:
-                    farm_string += 'modelEditor -e -displayTextures 0 %s;' % active_panel
+                    script.model_editor(active_panel, 'displayTextures', False)
                 else:
                     cmds.modelEditor(active_panel, e=True, displayTextures=False)
 
@@ -568,8 +662,8 @@ class AppDialog(QtGui.QWidget):
                 self.ui.progress_label.setText('Setting Default Material on!')
                 logger.info('Setting Default Material on!')
                 if build_string:
-                    farm_string += 'modelEditor -e -udm 1 %s;' % active_panel
-                    farm_string += 'modelEditor -e -displayTextures 0 %s;' % active_panel
+                    script.model_editor(active_panel, 'udm', True)
+                    script.model_editor(active_panel, 'displayTextures', False)
                 else:
                     cmds.modelEditor(active_panel, e=True, udm=True)
                     cmds.modelEditor(active_panel, e=True, displayTextures=False)
@@ -578,7 +672,7 @@ class AppDialog(QtGui.QWidget):
                 self.ui.progress_label.setText('Setting Default Material off!')
                 logger.info('Setting Default Material off!')
                 if build_string:
-                    farm_string += 'modelEditor -e -udm 0 %s;' % active_panel
+                    script.model_editor(active_panel, 'udm', False)
                 else:
                     cmds.modelEditor(active_panel, e=True, udm=False)
 
@@ -589,7 +683,7 @@ class AppDialog(QtGui.QWidget):
                 self.ui.progress_label.setText('Setting Hardware Fog on!')
                 logger.info('Setting Hardware Fog on!')
                 if build_string:
-                    farm_string += 'modelEditor -e -fogging 1 %s;' % active_panel
+                    script.model_editor(active_panel, 'fogging', True)
                 else:
                     cmds.modelEditor(active_panel, e=True, fogging=True)
             else:
@@ -597,7 +691,7 @@ class AppDialog(QtGui.QWidget):
                 self.ui.progress_label.setText('Setting Hardware Fog off!')
                 logger.info('Setting Hardware Fog off!')
                 if build_string:
-                    farm_string += 'modelEditor -e -fogging 0 %s;' % active_panel
+                    script.model_editor(active_panel, 'fogging', False)
                 else:
                     cmds.modelEditor(active_panel, e=True, fogging=False)
 
@@ -608,7 +702,7 @@ class AppDialog(QtGui.QWidget):
                 self.ui.progress_label.setText('Setting Use Lights on!')
                 logger.info('Setting Use Lights on!')
                 if build_string:
-                    farm_string += 'modelEditor -e -displayLights "all" %s;' % active_panel
+                    script.model_editor(active_panel, 'displayLights', 'all')
                 else:
                     cmds.modelEditor(active_panel, e=True, displayLights='all')
             else:
@@ -616,7 +710,7 @@ class AppDialog(QtGui.QWidget):
                 self.ui.progress_label.setText('Setting Use Lights off!')
                 logger.info('Setting Use Lights off!')
                 if build_string:
-                    farm_string += 'modelEditor -e -displayLights "none" %s;' % active_panel
+                    script.model_editor(active_panel, 'displayLights', 'none')
                 else:
                     cmds.modelEditor(active_panel, e=True, displayLights='none')
 
@@ -627,7 +721,7 @@ class AppDialog(QtGui.QWidget):
                 self.ui.progress_label.setText('Setting Motion Blur on!')
                 logger.info('Setting Motion Blur on!')
                 if build_string:
-                    farm_string += 'setAttr "hardwareRenderingGlobals.motionBlurEnable" 1;'
+                    script.set_attr('hardwareRenderingGlobals.motionBlurEnable', True)
                 else:
                     cmds.setAttr('hardwareRenderingGlobals.motionBlurEnable', 1)
             else:
@@ -635,7 +729,7 @@ class AppDialog(QtGui.QWidget):
                 self.ui.progress_label.setText('Setting Motion Blur off!')
                 logger.info('Setting Motion Blur off!')
                 if build_string:
-                    farm_string += 'setAttr "hardwareRenderingGlobals.motionBlurEnable" 0;'
+                    script.set_attr('hardwareRenderingGlobals.motionBlurEnable', False)
                 else:
                     cmds.setAttr('hardwareRenderingGlobals.motionBlurEnable', 0)
 
@@ -646,8 +740,8 @@ class AppDialog(QtGui.QWidget):
                 self.ui.progress_label.setText('Setting Ambient Occlusion on!')
                 logger.info('Setting Ambient Occlusion on!')
                 if build_string:
-                    farm_string += 'setAttr "hardwareRenderingGlobals.ssaoEnable" 1;'
-                    farm_string += 'setAttr "hardwareRenderingGlobals.ssaoAmount" 3;'
+                    script.set_attr('hardwareRenderingGlobals.ssaoEnable', True)
+                    script.set_attr('hardwareRenderingGlobals.ssaoAmount', 3)
                 else:
                     cmds.setAttr('hardwareRenderingGlobals.ssaoEnable', 1)
                     cmds.setAttr('hardwareRenderingGlobals.ssaoAmount', 3)
@@ -656,8 +750,8 @@ class AppDialog(QtGui.QWidget):
                 self.ui.progress_label.setText('Setting Ambient Occlusion off!')
                 logger.info('Setting Ambient Occlusion off!')
                 if build_string:
-                    farm_string += 'setAttr "hardwareRenderingGlobals.ssaoEnable" 0;'
-                    farm_string += 'setAttr "hardwareRenderingGlobals.ssaoAmount" 3;'
+                    script.set_attr('hardwareRenderingGlobals.ssaoEnable', False)
+                    script.set_attr('hardwareRenderingGlobals.ssaoAmount', 3)
                 else:
                     cmds.setAttr('hardwareRenderingGlobals.ssaoEnable', 0)
                     cmds.setAttr('hardwareRenderingGlobals.ssaoAmount', 3)
@@ -669,7 +763,7 @@ class AppDialog(QtGui.QWidget):
                 self.ui.progress_label.setText('Setting Anti-Aliasing on!')
                 logger.info('Setting Anti-Aliasing on!')
                 if build_string:
-                    farm_string += 'setAttr "hardwareRenderingGlobals.multiSampleEnable" 1;'
+                    script.set_attr('hardwareRenderingGlobals.multiSampleEnable', True)
                 else:
                     cmds.setAttr('hardwareRenderingGlobals.multiSampleEnable', 1)
             else:
@@ -677,7 +771,7 @@ class AppDialog(QtGui.QWidget):
                 self.ui.progress_label.setText('Setting Anti-Aliasing off!')
                 logger.info('Setting Anti-Aliasing off!')
                 if build_string:
-                    farm_string += 'setAttr "hardwareRenderingGlobals.multiSampleEnable" 0;'
+                    script.set_attr('hardwareRenderingGlobals.multiSampleEnable', False)
                 else:
                     cmds.setAttr('hardwareRenderingGlobals.multiSampleEnable', 0)
 
@@ -697,12 +791,13 @@ class AppDialog(QtGui.QWidget):
                 self.ui.blaster_progress.setValue(25)
                 self.ui.progress_label.setText('Setting up Farm Blaster...')
                 logger.info('Setting up Farm Blaster...')
-                self.farm_blast(farm_string=farm_string, viewport=viewport)
+                self.farm_blast(script=script, viewport=viewport)
             else:
                 self.ui.blaster_progress.setValue(25)
                 self.ui.progress_label.setText('Setting up Local Blaster...')
                 logger.info('Setting up Local Blaster...')
                 self.local_blast(viewport=viewport)
+            self.commit_publishes()
 
             # Return to the previous settings.
             self.ui.progress_label.setText('Returning previous viewport settings...')
@@ -725,10 +820,36 @@ class AppDialog(QtGui.QWidget):
             'entity': {'type': self.entity_type, 'id': self.id},
             'sg_task': {'type': 'Task', 'id': self.task_id}
         }
-        version_data = self.sg.shotgun.create('Version', data)
+        version_data = self.publisher.create('Version', data)
         return version_data
 
-    def submit_to_deadline(self, string=None):
+    def commit_publishes(self):
+        """
+        Sends the Shotgun writes queued so far.
+        :return: True if they went through
+        """
+        try:
+            self.publisher.commit()
+        except Exception, e:
+            logger.error('Publishing to Shotgun failed! %s' % e)
+            return False
+        return True
+
+    def scene_complexity(self):
+        """
+        Rough measure of how heavy the scene is to draw: visible faces in millions, scaled by the blast resolution.
+        Farm history stores per-frame times against this so light and heavy shots can share one model.
+        """
+        meshes = cmds.ls(type='mesh', noIntermediate=True, visible=True) or []
+        faces = 0
+        if meshes:
+            faces = cmds.polyEvaluate(meshes, face=True)
+            if not isinstance(faces, (int, long)):
+                faces = 0
+        scale = int(self.ui.scale.currentText().strip('%')) / 100.0
+        return round((1.0 + faces / 1000000.0) * scale * scale, 3)
+
+    def submit_to_deadline(self, script=None, fingerprint=None):
         logger.info('Submitting in Deadline...')
         self.ui.blaster_progress.setValue(70)
         self.ui.progress_label.setText('Submitting to Deadline...')
@@ -743,9 +864,34 @@ class AppDialog(QtGui.QWidget):
         start = self.ui.start_frame.value()
         end = self.ui.end_frame.value()
 
-        # Pasted from here
-        # ----------------------------------------------------------------------------
-        all_pools = self.list_deadline_pools()
+        # Let the farm history pick the pool, machine limit and chunk size when it knows better.
+        group = group_name
+        machine_limit = 5
+        # Deadline's default, unless the farm history picks one.
+        chunk_size = None
+        complexity = self.scene_complexity()
+        farm_mode = self._app.get_setting('farm_recommendations')
+        if farm_mode != 'off':
+            recommendation = self.history.recommend(frames=int(end - start) + 1, complexity=complexity,
+                                                    pools=all_pools,
+                                                    current={'pool': pool, 'group': group,
+                                                             'machine_limit': machine_limit, 'chunk_size': 1})
+            if recommendation:
+                logger.info('Farm history recommends pool %(pool)s, group %(group)s, machine limit %(machine_limit)s '
+                            'and chunk size %(chunk_size)s, about %(estimate)is to turn around.' % recommendation)
+                speeds = recommendation['worker_speeds']
+                if speeds:
+                    logger.info('Workers there render a frame in %s.' % ', '.join(
+                        ['%.1fs on %s' % (speeds[name], name) for name in sorted(speeds, key=speeds.get)]))
+                if farm_mode == 'auto':
+                    pool = recommendation['pool']
+                    group = recommendation['group'] or group_name
+                    machine_limit = recommendation['machine_limit']
+                    chunk_size = recommendation['chunk_size']
+        if script is not None and script.writes_movie():
+            # Every task blasts its own frames into the same .mov, so a movie has to be a single task.
+            chunk_size = int(end - start) + 1
+            machine_limit = 1
 
         logger.debug('Setup Deadline Environment and Datetime...')
         self.ui.progress_label.setText('Setup Deadline Environment and Datetime...')
@@ -775,18 +921,16 @@ class AppDialog(QtGui.QWidget):
         # I need to get the asset or shot path from maya! Not the playblast path.
         # Then I can extract values from that, and use it to POPULATE the playvblast path.
         if self.entity_type == 'Asset':
-            path_settings = self.sg.templates['maya_asset_work']
-            output_settings = self.sg.templates['maya_asset_playblast']
+            work_template = 'maya_asset_work'
+            output_template = 'maya_asset_playblast'
         elif self.entity_type == 'Shot':
-            path_settings = self.sg.templates['maya_shot_work']
-            output_settings = self.sg.templates['maya_shot_playblast']
+            work_template = 'maya_shot_work'
+            output_template = 'maya_shot_playblast'
         else:
-            path_settings = None
             return False
-        template_settings = path_settings.get_fields(file_name)
-        template_settings['timestamp'] = timestamp
-        template_settings['file_ext'] = self.ui.render_formats.currentText()
-        print 'TEMPATE SETTINGS: %s' % template_settings
+        layout = self.templates.plan(work_template, output_template, [file_name],
+                                     {'timestamp': timestamp, 'file_ext': self.ui.render_formats.currentText()})
+        template_settings = layout[file_name]['fields']
         # template_settings - Asset:
         #  {
         #   'version': 2,
@@ -811,35 +955,25 @@ class AppDialog(QtGui.QWidget):
         print 'TESTING: %s' % self.project_name
         project = self.project_name.lower()
 
-        output_path = output_settings.apply_fields(template_settings)
+        output_path = layout[file_name]['path']
         version = template_settings['version']
 
-        t = 0
-
         # I know I won't need layers, but what's in here that I DO need?
         # lyr = str(layer)
-        job_info = ''
-        plugin_info = ''
-        job_path = os.environ['TEMP'] + '\\_job_submissions'
-        logger.debug('Checking job submission path...')
-        if not os.path.exists(job_path):
-            os.mkdir(job_path)
-        logger.debug('Creating job and plugin files...')
-        ji_filename = '%s_%s%s%s%s%s_jobInfo.job' % (base_name, d_flat, h, m, s, t)
-        ji_filepath = job_path + '\\' + ji_filename
-        pi_filename = '%s_%s%s%s%s%s_pluginInfo.job' % (base_name, d_flat, h, m, s, t)
-        pi_filepath = job_path + '\\' + pi_filename
-        job_info_file = open(ji_filepath, 'w+')
-        plugin_info_file = open(pi_filepath, 'w+')
+        logger.debug('Creating job specification...')
+        job = JobSpec(name='%s - %s' % (base_name, timestamp))
 
         # Create a Shotgun Version for Draft...
         # This may still be mostly good.  I'll follow that path when I come back to it.
         logger.info('Creating Shotgun Version for %s...' % base_name)
         draft = self.create_draft_version(version_name=base_name, timestamp=timestamp)
+        # Draft needs the Version id, so the batch goes out now rather than at the end of the run.
+        if not self.commit_publishes():
+            return False
 
         # Setup JobInfo
         logger.debug('Collecting user, resolution, frames and pool data...')
-        user_name = os.environ['USERNAME']
+        user_name = os.environ.get(env_user, user)
 
         # The frames will need to be added if it's not in the command string already
         frames = '%s-%s' % (start, end)
@@ -856,118 +990,126 @@ class AppDialog(QtGui.QWidget):
         # resolutionHeight *= resolution_scale
         # resolutionWidth *= resolution_scale
 
-        # The job_info file needs to match the requirements for a regular maya deadline submission.
-        logger.debug('Creating Job Info File...')
-        job_info += 'Name=%s - %s\n' % (base_name, timestamp)
-        job_info += 'UserName=%s\n' % user_name
-        job_info += 'Region=none\n'
-        job_info += 'Comment=Blaster is shooting Greedo...\n'
-        job_info += 'Group=%s\n' % group_name
-        job_info += 'Frames=%s\n' % frames
-        job_info += 'Pool=%s\n' % pool
-        job_info += 'Priority=65\n'
-        job_info += 'Blacklist=%s\n' % blacklist
-        job_info += 'MachineLimit=5\n'
-        job_info += 'ScheduledStartDateTime=%s/%s/%s %s:%s\n' % (D, M, Y, h, m)
-        job_info += 'Plugin=CommandLine\n'
+        # The job_info needs to match the requirements for a regular maya deadline submission.
+        logger.debug('Setting Job Info...')
+        job.set_job('UserName', user_name)
+        job.set_job('Region', 'none')
+        job.set_job('Comment', 'Blaster is shooting Greedo...')
+        job.set_job('Group', group)
+        job.set_job('Frames', frames)
+        if chunk_size:
+            job.set_job('ChunkSize', chunk_size)
+        job.set_job('Pool', pool)
+        job.set_job('Priority', 65)
+        job.set_job('Blacklist', blacklist)
+        job.set_job('MachineLimit', machine_limit)
+        job.set_job('ScheduledStartDateTime', '%s/%s/%s %s:%s' % (D, M, Y, h, m))
 
         # The following are Version settings.
-        job_info += 'ExtraInfo0=%s\n' % template_settings['task_name']
-        job_info += 'ExtraInfo1=%s\n' % project
-        job_info += 'ExtraInfo2=%s\n' % template_settings[self.entity_type]
-        job_info += 'ExtraInfo3=%s\n' % version_name
-        job_info += 'ExtraInfo4=Blaster File\n'
-        job_info += 'ExtraInfo5=%s\n' % user_name
+        job.set_extra_info(0, template_settings['task_name'])
+        job.set_extra_info(1, project)
+        job.set_extra_info(2, template_settings[self.entity_type])
+        job.set_extra_info(3, version_name)
+        job.set_extra_info(4, 'Blaster File')
+        job.set_extra_info(5, user_name)
         # Draft Submission details
         # TODO: Rework the Draft Submission
         # The following needs to be added after the main submission.
         # Essentially, Submit the job, find the version ID that it created, and then amend the Job Properties with
         # the following.  For now, it will just create 2 different versions that don't entirely work right.
         # small price to pay for the moment.
-        job_info += 'ExtraInfoKeyValue0=UserName=%s\n' % user_name
-        job_info += 'ExtraInfoKeyValue1=DraftFrameRate=24\n'
-        job_info += 'ExtraInfoKeyValue2=DraftExtension=mov\n'
-        job_info += 'ExtraInfoKeyValue3=DraftCodec=h264\n'
-        job_info += 'ExtraInfoKeyValue4=DraftQuality=100\n'
-        job_info += 'ExtraInfoKeyValue5=Description=Blaster playblast file\n'
-        job_info += 'ExtraInfoKeyValue6=ProjectName=%s\n' % project
-        job_info += 'ExtraInfoKeyValue7=EntityName=%s\n' % template_settings[self.entity_type]
-        job_info += 'ExtraInfoKeyValue8=EntityType=Asset\n'
-        job_info += 'ExtraInfoKeyValue9=DraftType=movie\n'
-        job_info += 'ExtraInfoKeyValue10=VersionId=%s\n' % draft['id']
-        job_info += 'ExtraInfoKeyValue11=DraftColorSpaceIn=Identity\n'
-        job_info += 'ExtraInfoKeyValue12=DraftColorSpaceOut=Identity\n'
-        job_info += 'ExtraInfoKeyValue13=VersionName=%s\n' % version_name
-        job_info += 'ExtraInfoKeyValue14=TaskId=-1\n'
-        job_info += 'ExtraInfoKeyValue15=ProjectId=%s\n' % self.project_id
-        job_info += 'ExtraInfoKeyValue16=DraftUploadToShotgun=True\n'
-        job_info += 'ExtraInfoKeyValue17=TaskName=%s\n' % template_settings['task_name']
-        job_info += 'ExtraInfoKeyValue18=DraftResolution=1\n'
-        job_info += 'ExtraInfoKeyValue19=EntityId=%s\n' % self.id
-        job_info += 'ExtraInfoKeyValue20=SubmitQuickDraft=True\n'
+        job.add_extra_info_key_values([
+            ('UserName', user_name),
+            ('DraftFrameRate', 24),
+            ('DraftExtension', 'mov'),
+            ('DraftCodec', 'h264'),
+            ('DraftQuality', 100),
+            ('Description', 'Blaster playblast file'),
+            ('ProjectName', project),
+            ('EntityName', template_settings[self.entity_type]),
+            ('EntityType', 'Asset'),
+            ('DraftType', 'movie'),
+            ('VersionId', draft['id']),
+            ('DraftColorSpaceIn', 'Identity'),
+            ('DraftColorSpaceOut', 'Identity'),
+            ('VersionName', version_name),
+            ('TaskId', -1),
+            ('ProjectId', self.project_id),
+            ('DraftUploadToShotgun', True),
+            ('TaskName', template_settings['task_name']),
+            ('DraftResolution', 1),
+            ('EntityId', self.id),
+            ('SubmitQuickDraft', True),
+            ('BlasterComplexity', complexity),
+            ('BlasterFingerprint', fingerprint or '')
+        ])
         # End Draft Submission details
-        job_info += 'OverrideTaskExtraInfoNames=False\n'
-        job_info += 'MachineName=%s\n' % platform.node()
-        job_info += 'Plugin=MayaCmd\n'
+        job.set_job('OverrideTaskExtraInfoNames', False)
+        job.set_job('MachineName', platform.node())
         output_file = '%s.####.%s' % (base_name, self.ui.render_formats.currentText())
         # output_directory = '%s%s/%s/v%03d' % (output_path, template_settings['task_name'], layer, version)
         output_directory = os.path.dirname(output_path)
-        # output_directory = output_directory.replace('/', '\\')
-        job_info += 'OutputDirectory0=%s\n' % output_directory
-        job_info += 'OutputFilename0=%s\n' % output_file
-        job_info += 'EventOptIns='
-        job_info_file.write(job_info)
-        job_info_file.close()
+        job.set_job('OutputDirectory0', output_directory)
+        job.set_job('OutputFilename0', output_file)
+        job.set_job('EventOptIns', '')
 
         # Setup PluginInfo
-        logger.debug('Creating PluginInfo file...')
-        plugin_info += 'Executable=%s\n' % executable
-        plugin_info += 'Arguments=%s\n' % string
-        plugin_info += 'StartupDirectory=\n'
-        plugin_info += 'ShellExecute=False\n'
-        plugin_info += 'Shell=default\n'
-
-        if cmds.about(q=True, w64=True):
-            win = '64bit'
+        logger.debug('Setting Plugin Info...')
+        job.set_plugin('Executable', mayabatch_executable())
+        if not script.scene_file:
+            script.scene_file = file_name
+        script_root = self._app.get_setting('blast_script_root')
+        if script_root:
+            script_root = os.path.expandvars(script_root)
         else:
-            win = '32bit'
-        # plugin_info += 'Build=%s\n' % win
-        # plugin_info += 'ProjectPath=%s\n' % proj_root
-        # plugin_info += 'CommandLineOptions=\n'
-        # plugin_info += 'ImageWidth=%s\n' % resolutionWidth
-        # plugin_info += 'ImageHeight=%s\n' % resolutionHeight
-        # plugin_info += 'OutputFilePath=%s\n' % output_path
-        # plugin_info += 'OutputFilePrefix=\n'
-        # plugin_info += 'Camera=%s\n' % camera[0]
-        # plugin_info += 'Camera0=\nCamera1=%s\n' % camera[0]
-        # plugin_info += 'Camera2=front\nCamera3=persp\nCamera4=side\nCamera5=top\n'
-        # plugin_info += 'SceneFile=%s\n' % file_name
-        # plugin_info += 'IgnoreError211=1\n'
-        # plugin_info += 'UseOnlyCommandLineOptions=False\n'
-        plugin_info_file.write(plugin_info)
-        plugin_info_file.close()
-
-        # degree = float(degree_slice)
-        # frame_range = float(end - start + 1)
-        # slice_mult = (frame_range/2) / 360.00
-        # slice_frames = int(slice_mult * degree)
-        # slice_frame = 0
+            script_root = os.path.join(file_path, 'blaster')
+        try:
+            script_path = script.write(script_root)
+        except (BlastScriptError, IOError, OSError), e:
+            logger.error('The blast script could not be written! %s' % e)
+            return False
+        # Workers source the script straight from the shared script root.  An aux file copy would land in the
+        # job's own folder, which neither mayabatch nor the warm worker are pointed at.
+        job.set_plugin('Arguments', script.arguments(script_path))
+        warm_port = self._app.get_setting('warm_worker_port')
+        if warm_port:
+            # Hand the task to the node's resident Maya, which falls back to mayabatch if it isn't running.
+            job.set_plugin('Executable', self._app.get_setting('warm_worker_python'))
+            job.set_plugin('Arguments', client_arguments(port=warm_port, script_path=script_path,
+                                                         proc=script.proc_name(), fallback=mayabatch_executable(),
+                                                         module_root=self.farm_module_root()))
+        job.set_plugin('StartupDirectory', '')
+        job.set_plugin('ShellExecute', False)
+        job.set_plugin('Shell', 'default')
+
+        # Job files are only written out when asked for, to debug a submission.
+        dump_path = self._app.get_setting('job_dump_directory')
+        if dump_path:
+            job.dump(os.path.expandvars(dump_path), '%s_%s%s%s%s' % (base_name, d_flat, h, m, s))
+
         try:
             self.ui.blaster_progress.setValue(82)
             self.ui.progress_label.setText('Submitting the Job to Deadline...')
             logger.info('Submitting the job to Deadline...')
-            submitted = self.dl.Jobs.SubmitJobFiles(ji_filepath, pi_filepath, idOnly=True)
-            # TODO: The following example is the basic idea behind submitting the python file:
-            # submitted = self.dl.Jobs.SubmitJobFiles(ji_filepath, pi_filepath, aux=[pythonFile], idOnly=True)
-            # How that's fully implemented remains to be figured out.
-
+            submitted = job.submit(self.dl)
+            logger.info('Job %s submitted.' % submitted)
+            self.monitor.watch(job_id=submitted, name=job.get_job('Name'))
         except Exception, e:
             submitted = False
             logger.error('JOB SUBMISSION FAILED! %s' % e)
-        t += 1
+        return submitted
+
+    def farm_module_root(self):
+        """
+        Where the blast nodes find Blaster's standalone farm modules, or None if they see them at the same path.
+        """
+        module_root = self._app.get_setting('farm_module_root')
+        if module_root:
+            return os.path.expandvars(module_root)
+        return None
 
-    def farm_blast(self, farm_string=None, viewport=None):
-        if farm_string:
+    def farm_blast(self, script=None, viewport=None):
+        if script:
             # Farm Blast Deadline Setup
             # -----------------------------------------------------------------------------------------------
             self.ui.blaster_progress.setValue(30)
@@ -1015,18 +1157,99 @@ class AppDialog(QtGui.QWidget):
             self.ui.blaster_progress.setValue(55)
             self.ui.progress_label.setText('Creating Blaster Stream...')
             logger.info('Creating Blaster Stream...')
-            if save_to:
-                farm_string += 'playblast -format %s -filename "%s" -sqt=0 -cc 1 -v 1 -st %s -et %s -orn %s -os ' \
-                               '-fp 4 -p %s -qlt %s -c "%s";' % (output_format, save_to, st, et, ornaments, scale,
-                                                                 quality, encoding)
+            script.playblast(format=output_format, filename=save_to, sqt=0, cc=True, v=True, orn=ornaments, os=True,
+                             fp=4, p=scale, qlt=quality, c=encoding)
+
+            # Don't send the same blast to the farm twice.  The fingerprint is of the saved scene, so a scene with
+            # unsaved changes, or never saved at all, always goes to the farm.
+            fingerprint = None
+            scene_file = cmds.file(q=True, sn=True)
+            if not scene_file or cmds.file(q=True, modified=True):
+                logger.info('The scene has unsaved changes, not looking for an identical farm blast.')
             else:
-                farm_string += 'playblast -format %s sqt=0 -cc 1 -v 1 -st %s -et %s -orn %s -os 1 -fp 4' \
-                               '-p %s -qlt %s -c "%s";' % (output_format, st, et, ornaments, scale, quality, encoding)
+                try:
+                    fingerprint = self.submissions.fingerprint(scene_file, {'script': script.settings_hash(),
+                                                                            'frames': [st, et]})
+                except (IOError, OSError), e:
+                    logger.warning('Could not fingerprint %s: %s' % (scene_file, e))
+            if fingerprint and self.attach_to_existing(fingerprint=fingerprint):
+                return
             self.ui.progress_label.setText('Blasting to the farm...')
             self.ui.blaster_progress.setValue(65)
             logger.info('Blasting to the farm...')
-            logger.info('farm string: %s' % farm_string)
-            self.submit_to_deadline(string=farm_string)
+            package_root = self._app.get_setting('blast_package_root')
+            if package_root:
+                self.ui.progress_label.setText('Packaging the scene for the farm...')
+                logger.info('Packaging the scene for the farm...')
+                scene_name = os.path.basename(cmds.file(q=True, sn=True)).rsplit('.', 1)[0]
+                package_name = '%s_%s' % (scene_name, datetime.now().strftime('%Y%m%d%H%M%S'))
+                package = build_blast_package(camera=self.ui.cameras.currentText(),
+                                              package_root=os.path.expandvars(package_root),
+                                              package_name=package_name, frame_range=(st, et))
+                if package:
+                    script.scene_file = package
+                else:
+                    package_root = None
+            cache_root = self._app.get_setting('worker_cache_root')
+            if cache_root:
+                # A blast package has its references imported, so only a full scene has any to localize.
+                references = {}
+                if not package_root:
+                    references = self.top_level_references()
+                script.localize(cache_root=os.path.expandvars(cache_root),
+                                cache_bytes=int(self._app.get_setting('worker_cache_size')) * 1024 ** 3,
+                                references=references, module_root=self.farm_module_root())
+            submitted = self.submit_to_deadline(script=script, fingerprint=fingerprint)
+            if submitted and fingerprint:
+                self.submissions.record(fingerprint=fingerprint, job_id=submitted)
+
+    def attach_to_existing(self, fingerprint=None):
+        """
+        Looks for a farm job that already rendered, or is rendering, this exact blast and watches it instead of
+        submitting again.
+        :return: True if an existing job was found
+        """
+        previous = self.submissions.lookup(fingerprint)
+        if not previous:
+            return False
+        try:
+            job = self.dl.Jobs.GetJob(previous['job_id'])
+        except Exception, e:
+            logger.warning('Could not check job %s: %s' % (previous['job_id'], e))
+            return False
+        if isinstance(job, list):
+            job = job and job[0] or None
+        if not isinstance(job, dict):
+            self.submissions.forget(fingerprint)
+            return False
+        summary = summarize_job(job)
+        if summary['status'] in ['Failed', 'Unknown']:
+            self.submissions.forget(fingerprint)
+            return False
+        logger.info('Identical blast already on the farm as %s, attaching to it.' % summary['id'])
+        self.ui.progress_label.setText('Identical blast already on the farm: %s (%s)' % (summary['name'],
+                                                                                       summary['status']))
+        if summary['status'] != 'Completed':
+            self.monitor.watch(job_id=summary['id'], name=summary['name'])
+        return True
+
+    def top_level_references(self):
+        """
+        Returns the loaded, top level references of the scene as reference node: file path.
+        """
+        references = {}
+        for node in cmds.ls(type='reference') or []:
+            if node == 'sharedReferenceNode' or '_UNKNOWN_REF_NODE_' in node:
+                continue
+            try:
+                if cmds.referenceQuery(node, isNodeReferenced=True):
+                    continue
+                if not cmds.referenceQuery(node, isLoaded=True):
+                    continue
+                references[node] = cmds.referenceQuery(node, filename=True, withoutCopyNumber=True)
+            except RuntimeError:
+                continue
+        return references
 
     def save_to_pipeline(self):
         final_path = ''
@@ -1067,13 +1290,13 @@ class AppDialog(QtGui.QWidget):
         rel_path = rel_path.replace('\\', '/').strip('/')
 
         if self.entity_type == 'Shot':
-            template = self.sg.templates['maya_shot_playblast']
+            template = 'maya_shot_playblast'
         elif self.entity_type == 'Asset':
-            template = self.sg.templates['maya_asset_playblast']
+            template = 'maya_asset_playblast'
         else:
             template = None
         if template:
-            settings = template.get_fields(rel_path)
+            settings = self.templates.get_fields(template, rel_path)
         #
         # template_settings['timestamp'] = timestamp
         # template_settings['file_ext'] = self.ui.render_formats.currentText()
@@ -1081,20 +1304,18 @@ class AppDialog(QtGui.QWidget):
         print settings
         return final_path
 
-    def publish_version(self, playblast=None, filename=None, start_time=None):
+    def publish_version(self, playblast=None, filename=None, start_time=None, publisher=None):
+        publisher = publisher or self.publisher
         print filename
         print 'playblast: %s' % playblast
         if playblast:
             print 'Yo Dude.'
             playblast_filename = os.path.basename(playblast)
             playblast_filename = playblast_filename.rsplit('.', 1)[0]
-            if '#' in filename:
-                pattern = '#*'
-                find_hashes = re.search(pattern, filename)
-                print 'HASHES: %s' % find_hashes.group()
-                # filename = filename.replace('')
-            else:
-                print 'I didn\'t find a # in %s' % filename
+            # Sequences carry an index, so their frame range comes from it instead of a listing of the folder.
+            index = None
+            if frame_pattern.search(filename):
+                index = read_index(filename)
 
             data = {
                 'project': {'type': 'Project', 'id': self.project_id},
@@ -1106,14 +1327,27 @@ class AppDialog(QtGui.QWidget):
                 'sg_path_to_frames': playblast,
                 'user': {'type': 'HumanUser', 'id': self.sg_user_id}
             }
-
-            new_version = self.sg.shotgun.create('Version', data)
-            print 'NEW VERSION: %s' % new_version
-            version_id = new_version['id']
+            if index:
+                data['sg_first_frame'] = index['first']
+                data['sg_last_frame'] = index['last']
+                data['frame_count'] = index['count']
+                data['frame_range'] = '%s-%s' % (index['first'], index['last'])
+
+            # Created with the rest of the run's writes.  Uploads run in the background and survive Maya closing,
+            # so the blast is never held up by them.
             if os.path.splitext(playblast)[1] == '.mov':
-                self.sg.shotgun.upload('Version', version_id, playblast, 'sg_uploaded_movie')
+                uploads = [{'path': playblast, 'field': 'sg_uploaded_movie'}]
             else:
-                self.sg.shotgun.upload_thumbnail('Version', version_id, filename)
+                # Sequences get a scaled down thumbnail, filmstrip and proxy movie instead of full size frames.
+                media = review_media(filename, ffmpeg=self._app.get_setting('review_ffmpeg'))
+                uploads = []
+                if media['thumbnail']:
+                    uploads.append({'path': media['thumbnail'], 'kind': 'thumbnail'})
+                if media['filmstrip']:
+                    uploads.append({'path': media['filmstrip'], 'kind': 'filmstrip'})
+                if media['movie']:
+                    uploads.append({'path': media['movie'], 'field': 'sg_uploaded_movie'})
+            publisher.create('Version', data, uploads=uploads)
 
     def local_blast(self, viewport=None):
         '''
@@ -1169,8 +1403,43 @@ class AppDialog(QtGui.QWidget):
         # Get Quality
         quality = self.ui.quality_value_2.value()
 
-        # Show ornaments
+        # Show ornaments.  Burn-ins are drawn after the blast, so the viewport is blasted clean.
         ornaments = self.ui.show_ornaments.isChecked()
+        burnin = self._app.get_setting('burnin') and output_format == 'image'
+        if burnin:
+            ornaments = False
+
+        # Blast to local scratch, and move the result into place in the background.
+        final_to = save_to
+        scratch_root = self._app.get_setting('scratch_root')
+        if save_to:
+            self.ui.progress_label.setText('Checking the output volume...')
+            logger.info('Checking the output volume...')
+            check = self.preflight_blast(target=save_to, scratch_root=scratch_root, frames=int(et - st) + 1,
+                                         scale=scale, encoding=enocoding, output_format=output_format,
+                                         burnin=burnin)
+            if check['action'] == 'abort':
+                self.ui.progress_label.setText('Not enough space to blast!')
+                logger.error('Not enough space to blast! %s' % check['message'])
+                return
+            if check['message']:
+                logger.warning(check['message'])
+            if check['action'] == 'scratch' and not scratch_root:
+                scratch_root = tempfile.gettempdir()
+            elif check['action'] == 'direct':
+                scratch_root = None
+        if save_to and scratch_root:
+            try:
+                scratch = scratch_directory(scratch_root, os.path.basename(save_to))
+                save_to = os.path.join(scratch, os.path.basename(save_to))
+            except (IOError, OSError), e:
+                logger.warning('Could not use scratch, blasting straight to %s: %s' % (save_to, e))
+
+        # Proxies are scaled down from the master frames while the blast writes them.
+        proxy_writer = None
+        proxy_scales = self._app.get_setting('proxy_scales')
+        if save_to and output_format == 'image' and proxy_scales:
+            proxy_writer = ProxyWriter('%s.####.%s' % (save_to, enocoding), proxy_scales).start()
 
         self.ui.blaster_progress.setValue(60)
         self.ui.progress_label.setText('BLASTING...')
@@ -1184,9 +1453,173 @@ class AppDialog(QtGui.QWidget):
                                        st=st, et=et, p=scale, qlt=quality, c=enocoding)
             logger.debug('SAVE DATE RETURNS: %s' % save_data)
 
-        if shotgun_publish and save_data:
+        if save_data and frame_pattern.search(save_data) and self._app.get_setting('verify_frames'):
+            self.ui.blaster_progress.setValue(80)
+            self.ui.progress_label.setText('Checking frames...')
+            logger.info('Checking frames...')
+            duplicates = self._app.get_setting('verify_duplicates')
+            problems = verify_sequence(save_data, int(st), int(et), duplicates=duplicates)
+            bad_frames = sorted([frame for frame, problem in problems.items() if problem not in warning_problems])
+            if bad_frames:
+                # Only the bad frames are blasted again, straight over the top of the old ones, wherever the blast
+                # went.  Without a file name, Maya picked it, so it is read back from the blast's own frames.
+                blast_to = save_data[:frame_pattern.search(save_data).start()].rstrip('.')
+                self.ui.progress_label.setText('Blasting %i bad frames again...' % len(bad_frames))
+                logger.info('Blasting %i bad frames again...' % len(bad_frames))
+                for frame in bad_frames:
+                    try:
+                        cmds.playblast(format=output_format, filename=blast_to, sqt=0, cc=True, v=False, st=frame,
+                                       et=frame, orn=ornaments, os=True, fp=4, p=scale, qlt=quality, c=enocoding)
+                    except RuntimeError, e:
+                        logger.error('Could not blast frame %s again: %s' % (frame, e))
+                still_bad = [frame for frame, problem in
+                             verify_sequence(save_data, int(st), int(et), duplicates=duplicates).items()
+                             if problem not in warning_problems]
+                if still_bad:
+                    logger.error('%i frames are still bad after blasting them again: %s' % (
+                        len(still_bad), ', '.join([str(frame) for frame in sorted(still_bad)])))
+
+        if proxy_writer:
+            self.ui.progress_label.setText('Finishing proxies...')
+            logger.info('Finishing proxies...')
+            if save_data:
+                proxy_writer.pattern = save_data
+            proxy_writer.finish()
+
+        if save_data and frame_pattern.search(save_data):
+            self.ui.progress_label.setText('Indexing frames...')
+            logger.info('Indexing frames...')
+            settings_hash = hash_settings({'format': output_format, 'encoding': enocoding, 'scale': scale,
+                                           'quality': quality, 'ornaments': ornaments, 'frames': [st, et],
+                                           'camera': self.ui.cameras.currentText()})
+            try:
+                write_index(save_data, settings_hash=settings_hash)
+            except (IOError, OSError), e:
+                logger.warning('Could not index %s: %s' % (save_data, e))
+
+        burnt_in = False
+        if save_data and burnin and frame_pattern.search(save_data):
+            self.ui.progress_label.setText('Burning in...')
+            logger.info('Burning in...')
+            burnin_data = self.burnin_blast(save_data=save_data, start=int(st), end=int(et))
+            if burnin_data:
+                # The burnt-in copy is the one published, so it is indexed for its frame range too.
+                burnt_in = True
+                try:
+                    write_index(burnin_data, settings_hash=settings_hash)
+                except (IOError, OSError), e:
+                    logger.warning('Could not index %s: %s' % (burnin_data, e))
+
+        if save_data and save_to != final_to:
+            self.ui.blaster_progress.setValue(90)
+            self.ui.progress_label.setText('Moving the blast into place...')
+            logger.info('Moving the blast into place...')
+            self.stage_blast(save_data=save_data, final_to=final_to, publish=shotgun_publish, start_time=st,
+                             burnt_in=burnt_in, compact=pipeline)
+        elif shotgun_publish and save_data:
             self.ui.blaster_progress.setValue(90)
             self.ui.progress_label.setText('Publishing...')
             logger.info('Publishing...')
-            self.publish_version(playblast=save_to, filename=save_data, start_time=st)
+            if burnt_in and save_to:
+                self.publish_version(playblast=os.path.join(os.path.dirname(save_to), burnin_folder,
+                                                            os.path.basename(save_to)),
+                                     filename=burnin_data, start_time=st)
+            else:
+                self.publish_version(playblast=save_to, filename=save_data, start_time=st)
+
+        if save_data and save_to and save_to == final_to:
+            # Staged blasts are indexed once they are in place.
+            self.apply_retention(os.path.dirname(save_data), compact=pipeline)
+
+    def apply_retention(self, directory=None, compact=False):
+        """
+        Indexes a playblast folder in the background.  With compact, and retention_keep_latest set, old blasts in it
+        are compacted too.  Only pipeline folders are compacted, never a folder the user picked.
+        """
+        if not directory or not os.path.isdir(directory):
+            return
+        keep_latest = self._app.get_setting('retention_keep_latest') if compact else None
+        policy = RetentionPolicy(keep_latest=keep_latest, shotgun=self.shotgun,
+                                 ffmpeg=self._app.get_setting('review_ffmpeg'))
+        thread = threading.Thread(target=policy.apply, args=(directory,), name='BlasterRetention')
+        thread.daemon = True
+        thread.start()
+
+    def preflight_blast(self, target=None, scratch_root=None, frames=None, scale=None, encoding=None,
+                        output_format=None, burnin=False):
+        """
+        Estimates the blast's size from the render resolution and checks the target, and scratch, can take it.
+        Without a scratch root, the system temp folder is what the blast can be redirected to.
+        """
+        estimate = estimate_size(width=cmds.getAttr('defaultResolution.width'),
+                                 height=cmds.getAttr('defaultResolution.height'), scale=scale, encoding=encoding,
+                                 frames=frames)
+        if output_format == 'image':
+            # Proxies add a quarter of the master's size at 50%, a sixteenth at 25%...  Burn-ins are a full copy.
+            proxy_scales = self._app.get_setting('proxy_scales')
+            estimate = int(estimate * (1 + sum([(scale / 100.0) ** 2 for scale in proxy_scales]) +
+                                       (1 if burnin else 0)))
+        min_throughput = 0
+        if not scratch_root:
+            min_throughput = self._app.get_setting('min_write_throughput') * 1024 ** 2
+        return preflight(target=target, estimate=estimate,
+                         scratch_root=os.path.expandvars(scratch_root or tempfile.gettempdir()),
+                         min_throughput=min_throughput, on_scratch=bool(scratch_root))
+
+    def burnin_blast(self, save_data=None, start=None, end=None):
+        """
+        Writes burnt-in copies of a blast's frames.  Focal lengths are read per frame from the blast camera here,
+        since Maya can only be asked from this thread.
+        """
+        camera = self.ui.cameras.currentText()
+        focal_lengths = {}
+        for frame in range(start, end + 1):
+            try:
+                focal_lengths[frame] = cmds.getAttr('%s.focalLength' % camera, time=frame)
+            except ValueError:
+                break
+        version = os.path.basename(cmds.file(q=True, sn=True)).rsplit('.', 1)[0]
+        return burnin_sequence(save_data, shot=self.entity, version=version, artist=self.sg_user_name,
+                               focal_lengths=focal_lengths)
+
+    def stage_blast(self, save_data=None, final_to=None, publish=False, start_time=None, burnt_in=False,
+                    compact=False):
+        """
+        Hands a blast on scratch to the stager, and publishes and indexes it once it is in place.
+        :param burnt_in: Publish the burnt-in copy instead of the clean frames
+        :param compact: Apply retention to the destination folder, once the master frames are in place
+        """
+        destination = os.path.dirname(final_to)
+        # Burn-ins and proxies follow the master frames into place.
+        folders = [None, burnin_folder] + [proxy_folder(scale) for scale in self._app.get_setting('proxy_scales')]
+        published_folder = burnin_folder if burnt_in else None
+        published_to = os.path.join(destination, burnin_folder, os.path.basename(final_to)) if burnt_in else final_to
+        published_data = os.path.join(os.path.dirname(published_to), os.path.basename(save_data))
+
+        def staged(result, folder=None):
+            if result['failed']:
+                return
+            if folder is None:
+                self.apply_retention(destination, compact=compact)
+            if publish and folder == published_folder:
+                # Runs on the staging thread, after this run's batch went out, so it gets a batch of its own.
+                publisher = PublishBatcher(shotgun=self.shotgun, uploads=self.uploads)
+                self.publish_version(playblast=published_to, filename=published_data, start_time=start_time,
+                                     publisher=publisher)
+                publisher.commit()
+
+        for folder in folders:
+            if folder:
+                pattern = os.path.join(os.path.dirname(save_data), folder, os.path.basename(save_data))
+                target = os.path.join(destination, folder)
+            else:
+                pattern = save_data
+                target = destination
+            sources = [path for frame, path in sequence_frames(pattern)]
+            if not sources:
+                continue
+            if os.path.exists(index_path(pattern)):
+                sources.append(index_path(pattern))
+            # The Version is only made once the published copy's frames are in place.
+            self.stager.stage(sources, target, callback=lambda result, folder=folder: staged(result, folder))
 
@@ -0,0 +1,156 @@
+# Copyright (c) 2013 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+import os
+from multiprocessing.pool import ThreadPool
+import sgtk
+from sgtk.platform.qt import QtCore, QtGui
+from .sequence_index import sequence_frames
+
+logger = sgtk.platform.get_logger(__name__)
+
+burnin_folder = 'burnin'
+burnin_workers = 4
+# Text height and band height, as parts of the frame height
+text_scale = 0.025
+band_scale = 0.045
+band_color = QtGui.QColor(0, 0, 0, 160)
+text_color = QtGui.QColor(230, 230, 230)
+
+
+class GlyphAtlas(object):
+    """
+    Text rendered once and reused on every frame.
+
+    Labels that don't change across a blast are drawn a single time, and frame numbers and focal lengths are put
+    together from pre-drawn characters, so burning a frame is only image copies.  Everything is drawn before the
+    frames are handed out, so the workers only ever read from it.
+    """
+    characters = '0123456789.-m '
+
+    def __init__(self, pixel_size=None):
+        self.font = QtGui.QFont('Arial')
+        self.font.setPixelSize(max(8, pixel_size))
+        self.metrics = QtGui.QFontMetrics(self.font)
+        self.labels = {}
+        self.glyphs = {}
+        for character in self.characters:
+            self.glyphs[character] = self.render(character)
+
+    def render(self, text=None):
+        image = QtGui.QImage(max(1, self.metrics.width(text)), self.metrics.height(),
+                             QtGui.QImage.Format_ARGB32_Premultiplied)
+        image.fill(QtCore.Qt.transparent)
+        painter = QtGui.QPainter(image)
+        painter.setFont(self.font)
+        painter.setPen(text_color)
+        painter.drawText(0, self.metrics.ascent(), text)
+        painter.end()
+        return image
+
+    def label(self, text=None):
+        if text not in self.labels:
+            self.labels[text] = self.render(text)
+        return self.labels[text]
+
+    def compose(self, text=None):
+        """
+        A run of pre-drawn characters, as a list of images.
+        """
+        return [self.glyphs[character] for character in text]
+
+
+class BurnIn(object):
+    """
+    Draws a blast's burn-ins onto copies of its frames: shot and version along the top, artist, focal length and
+    frame number along the bottom.
+    """
+
+    def __init__(self, frame_height=None, shot=None, version=None, artist=None):
+        self.band = int(frame_height * band_scale)
+        self.margin = self.band // 3
+        self.atlas = GlyphAtlas(int(frame_height * text_scale))
+        self.top_left = self.atlas.label(shot or '')
+        self.top_right = self.atlas.label(version or '')
+        self.bottom_left = self.atlas.label(artist or '')
+
+    def _draw_run(self, painter=None, images=None, x=None, y=None):
+        for image in images:
+            painter.drawImage(x, y, image)
+            x += image.width()
+
+    def burn(self, job=None):
+        """
+        :param job: (source frame, output path, frame number, focal length)
+        :return: The output path, or None if it failed
+        """
+        source, out_path, number, focal = job
+        image = QtGui.QImage(source)
+        if image.isNull():
+            logger.warning('Could not read %s for burn-in.' % source)
+            return None
+        image = image.convertToFormat(QtGui.QImage.Format_RGB32)
+        width = image.width()
+        height = image.height()
+        text_y = (self.band - self.atlas.metrics.height()) // 2
+        painter = QtGui.QPainter(image)
+        painter.fillRect(0, 0, width, self.band, band_color)
+        painter.fillRect(0, height - self.band, width, self.band, band_color)
+        painter.drawImage(self.margin, text_y, self.top_left)
+        painter.drawImage(width - self.margin - self.top_right.width(), text_y, self.top_right)
+        bottom_y = height - self.band + text_y
+        painter.drawImage(self.margin, bottom_y, self.bottom_left)
+        frame_run = self.atlas.compose('%04d' % number)
+        run_width = sum([glyph.width() for glyph in frame_run])
+        self._draw_run(painter, frame_run, width - self.margin - run_width, bottom_y)
+        if focal is not None:
+            focal_run = self.atlas.compose('%.1fmm' % focal)
+            focal_width = sum([glyph.width() for glyph in focal_run])
+            self._draw_run(painter, focal_run, (width - focal_width) // 2, bottom_y)
+        painter.end()
+        if not image.save(out_path, None, 95):
+            logger.warning('Could not write %s.' % out_path)
+            return None
+        return out_path
+
+
+def burnin_sequence(pattern=None, shot=None, version=None, artist=None, focal_lengths=None):
+    """
+    Writes burnt-in copies of a sequence's frames to a burnin folder beside them.  The clean frames are left as they
+    are, so the burn-ins can be made again or changed without blasting again.
+
+    :param focal_lengths: dict of frame number: focal length
+    :return: The burnt-in sequence's pattern, or None if no frame could be burnt in
+    """
+    frames = [(number, path) for number, path in sequence_frames(pattern) if number is not None]
+    if not frames:
+        return None
+    size = QtGui.QImageReader(frames[0][1]).size()
+    if not size.isValid():
+        return None
+    out_dir = os.path.join(os.path.dirname(pattern), burnin_folder)
+    if not os.path.exists(out_dir):
+        os.makedirs(out_dir)
+    burnin = BurnIn(frame_height=size.height(), shot=shot, version=version, artist=artist)
+    jobs = [(path, os.path.join(out_dir, os.path.basename(path)), number, (focal_lengths or {}).get(number))
+            for number, path in frames]
+    pool = ThreadPool(burnin_workers)
+    try:
+        written = pool.map(burnin.burn, jobs)
+    finally:
+        pool.close()
+        pool.join()
+    failed = len([path for path in written if path is None])
+    if failed == len(frames):
+        logger.error('None of the %i frames could be burnt in.' % failed)
+        return None
+    if failed:
+        logger.warning('%i of %i frames could not be burnt in.' % (failed, len(frames)))
+    return os.path.join(out_dir, os.path.basename(pattern))
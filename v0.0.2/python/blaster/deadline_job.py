@@ -0,0 +1,113 @@
+# Copyright (c) 2013 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+import os
+import sgtk
+
+logger = sgtk.platform.get_logger(__name__)
+
+
+def list_pools(dl):
+    """
+    Pool names on the farm, or an empty list if Deadline can't be reached.
+    :param dl: A DeadlineCon connection
+    """
+    try:
+        return dl.Pools.GetPoolNames() or []
+    except Exception, e:
+        logger.warning('Could not get the Deadline pools: %s' % e)
+        return []
+
+
+class JobSpec(object):
+    """
+    In-memory Deadline job specification.
+
+    Holds the JobInfo and PluginInfo key/value pairs that used to be written out to *_jobInfo.job and
+    *_pluginInfo.job files, and submits them straight to the Deadline web service.
+    """
+
+    def __init__(self, name=None, plugin='CommandLine'):
+        self.job_info = {}
+        self.plugin_info = {}
+        self.aux_files = []
+        # Keep insertion order, so dumped files read the same way the old hand-built ones did.
+        self._job_keys = []
+        self._plugin_keys = []
+        if name:
+            self.set_job('Name', name)
+        self.set_job('Plugin', plugin)
+
+    def set_job(self, key, value):
+        if key not in self.job_info:
+            self._job_keys.append(key)
+        self.job_info[key] = '%s' % value
+
+    def set_plugin(self, key, value):
+        if key not in self.plugin_info:
+            self._plugin_keys.append(key)
+        self.plugin_info[key] = '%s' % value
+
+    def set_extra_info(self, index, value):
+        self.set_job('ExtraInfo%s' % index, value)
+
+    def add_extra_info_key_values(self, pairs):
+        """
+        Appends ExtraInfoKeyValue entries after any that are already set.
+        :param pairs: List of (key, value) tuples
+        """
+        index = len([k for k in self.job_info if k.startswith('ExtraInfoKeyValue')])
+        for key, value in pairs:
+            self.set_job('ExtraInfoKeyValue%s' % index, '%s=%s' % (key, value))
+            index += 1
+
+    def add_aux_file(self, path):
+        if path and path not in self.aux_files:
+            self.aux_files.append(path)
+
+    def get_job(self, key, default=None):
+        return self.job_info.get(key, default)
+
+    def job_info_text(self):
+        return ''.join(['%s=%s\n' % (k, self.job_info[k]) for k in self._job_keys])
+
+    def plugin_info_text(self):
+        return ''.join(['%s=%s\n' % (k, self.plugin_info[k]) for k in self._plugin_keys])
+
+    def dump(self, directory, base_name):
+        """
+        Writes the job out as a standard pair of Deadline .job files.  Only used for debugging, submission never
+        needs them.
+        :param directory: Folder to write into.  Created if it doesn't exist.
+        :param base_name: File name prefix.
+        :return: (job_info_path, plugin_info_path)
+        """
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        ji_filepath = os.path.join(directory, '%s_jobInfo.job' % base_name)
+        pi_filepath = os.path.join(directory, '%s_pluginInfo.job' % base_name)
+        with open(ji_filepath, 'w') as ji:
+            ji.write(self.job_info_text())
+        with open(pi_filepath, 'w') as pi:
+            pi.write(self.plugin_info_text())
+        logger.debug('Job files dumped to %s' % directory)
+        return ji_filepath, pi_filepath
+
+    def submit(self, dl):
+        """
+        Submits the job through the Deadline web service.
+        :param dl: A DeadlineCon connection
+        :return: The new job id
+        """
+        submitted = dl.Jobs.SubmitJob(self.job_info, self.plugin_info, aux=self.aux_files, idOnly=True)
+        if isinstance(submitted, dict):
+            # idOnly returns {'_id': ...}, anything else is the error text from the web service.
+            return submitted.get('_id')
+        raise RuntimeError(submitted)
@@ -0,0 +1,278 @@
+# Copyright (c) 2013 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+import os
+import json
+import math
+import re
+import threading
+import sgtk
+from datetime import datetime
+from .localize import IndexLock
+
+logger = sgtk.platform.get_logger(__name__)
+
+# How many finished jobs a pool needs before it's trusted for a recommendation
+min_samples = 3
+max_records = 500
+machine_limits = [1, 2, 3, 5, 8, 10, 15, 20]
+# Rough cost of a mayabatch task starting up on a worker, in seconds
+task_startup = 60.0
+
+_history = None
+
+
+def get_farm_history(path=None):
+    """
+    Returns the shared history store.
+    """
+    global _history
+    if _history is None:
+        _history = FarmHistory(path)
+    return _history
+
+
+def parse_date(value=None):
+    """
+    Deadline dates look like 2019-01-14T22:46:55.123Z
+    """
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value[:19], '%Y-%m-%dT%H:%M:%S')
+    except ValueError:
+        return None
+
+
+def frame_count(frames=None):
+    """
+    Counts the frames in a Deadline frame list, ie. 1001-1064 or 1,5,10-20x2
+    """
+    count = 0
+    for chunk in ('%s' % frames).split(','):
+        match = re.match(r'^\s*(-?\d+)(?:\s*-\s*(-?\d+))?(?:\s*[xX:](\d+))?\s*$', chunk)
+        if not match:
+            continue
+        first = int(match.group(1))
+        last = int(match.group(2) or first)
+        step = int(match.group(3) or 1)
+        count += abs(last - first) // step + 1
+    return count
+
+
+def worker_class(worker=None):
+    """
+    The kind of machine a worker is, from its name without the number: render-fast-012 is render-fast.
+    """
+    return re.sub(r'[-_.]*\d+$', '', ('%s' % (worker or 'unknown')).lower()) or 'unknown'
+
+
+def worker_speeds(tasks=None, complexity=1.0):
+    """
+    Per-frame render time of each worker class that rendered a job, from its tasks' start and finish times.
+    :return: dict of worker class: {'tasks', 'per_frame'}
+    """
+    classes = {}
+    for task in tasks or []:
+        started = parse_date(task.get('started'))
+        finished = parse_date(task.get('finished'))
+        frames = frame_count(task.get('frames', ''))
+        if not (task.get('worker') and started and finished and frames):
+            continue
+        per_frame = max(0.0, (finished - started).total_seconds() - task_startup) / frames / complexity
+        stats = classes.setdefault(worker_class(task['worker']), {'tasks': 0, 'total': 0.0})
+        stats['tasks'] += 1
+        stats['total'] += per_frame
+    return dict([(name, {'tasks': stats['tasks'], 'per_frame': stats['total'] / stats['tasks']})
+                 for name, stats in classes.items()])
+
+
+class FarmHistory(object):
+    """
+    Local record of finished farm blasts, and a simple throughput model built on it.
+
+    Each record keeps the per-frame render time, the time spent queued, the pool, group and machine limit the job
+    ran with, and the classes of worker that rendered it with their own per-frame times.  Per-frame times are
+    stored relative to the scene complexity given at submission, so a heavy shot doesn't skew the estimate for a
+    light one.
+
+    The history file is shared by every Maya session on the machine, so saves merge with it under a lock.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.records = []
+        self._monitor = None
+        self._lock = threading.Lock()
+        self.load()
+
+    def load(self):
+        if self.path and os.path.exists(self.path):
+            try:
+                with open(self.path) as history:
+                    self.records = json.load(history)
+            except (IOError, ValueError), e:
+                logger.warning('Farm history could not be read: %s' % e)
+                self.records = []
+
+    def save(self):
+        """
+        Merges the records in memory with the ones other sessions saved since, and writes them all out.
+        """
+        if not self.path:
+            return
+        directory = os.path.dirname(self.path)
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        with IndexLock('%s.lock' % self.path):
+            records = dict([(entry['job_id'], entry) for entry in self.records])
+            self.load()
+            for entry in self.records:
+                records.setdefault(entry['job_id'], entry)
+            self.records = sorted(records.values(), key=lambda entry: entry.get('finished') or '')[-max_records:]
+            temp_path = '%s.%s.tmp' % (self.path, os.getpid())
+            with open(temp_path, 'w') as history:
+                json.dump(self.records, history)
+            if os.path.exists(self.path):
+                os.remove(self.path)
+            os.rename(temp_path, self.path)
+
+    def attach(self, monitor=None):
+        """
+        Records every job the monitor sees finish.  Safe to call each time the dialog opens.
+        """
+        if self._monitor is monitor:
+            return
+        self._monitor = monitor
+        monitor.job_finished.connect(self.record)
+
+    def record(self, summary=None):
+        if summary['status'] != 'Completed':
+            return
+        job = summary['job']
+        props = job.get('Props', {})
+        extra = props.get('ExDic', {})
+        submitted = parse_date(job.get('Date'))
+        started = parse_date(job.get('DateStart'))
+        finished = parse_date(job.get('DateComp'))
+        frames = frame_count(props.get('Frames', ''))
+        if not (submitted and started and finished and frames):
+            logger.debug('Not enough timing on %s to record it.' % summary['id'])
+            return
+        # A machine limit of 0 is no limit: every task can render at once.
+        machine_limit = props.get('MachLmt') or 0
+        tasks = summary['total'] or 1
+        machines = max(1, min(machine_limit or tasks, tasks))
+        waves = math.ceil(float(tasks) / machines)
+        chunk_size = math.ceil(float(frames) / tasks)
+        render_time = (finished - started).total_seconds()
+        complexity = float(extra.get('BlasterComplexity') or 1.0)
+        # Each wave of tasks pays the startup cost once, then renders a chunk.
+        per_frame = max(0.0, render_time / waves - task_startup) / chunk_size / complexity
+        entry = {
+            'job_id': summary['id'],
+            'pool': props.get('Pool'),
+            'group': props.get('Grp'),
+            'machine_limit': machine_limit,
+            'chunk_size': props.get('Chunk'),
+            'frames': frames,
+            'tasks': tasks,
+            'complexity': complexity,
+            'queue_wait': max(0.0, (started - submitted).total_seconds()),
+            'render_time': render_time,
+            'per_frame': per_frame,
+            'workers': worker_speeds(summary.get('tasks'), complexity),
+            'finished': job.get('DateComp')
+        }
+        if entry['workers']:
+            entry['worker_class'] = max(entry['workers'], key=lambda name: entry['workers'][name]['tasks'])
+        with self._lock:
+            self.records.append(entry)
+            try:
+                self.save()
+            except (IOError, OSError), e:
+                logger.warning('Farm history could not be saved: %s' % e)
+        logger.debug('Recorded farm history for %s' % summary['id'])
+
+    def turnaround(self, entries=None, frames=None, complexity=1.0, machine_limit=None, chunk_size=None):
+        """
+        Expected seconds from submission to completion of a job, from the recorded jobs of one pool and group.
+        A machine limit of 0 is no limit.
+        """
+        per_frame = sum([e['per_frame'] for e in entries]) / len(entries) * complexity
+        queue_wait = sum([e['queue_wait'] for e in entries]) / len(entries)
+        chunk_size = max(1, int(chunk_size or 1))
+        tasks = int(math.ceil(float(frames) / chunk_size))
+        machines = max(1, min(machine_limit or tasks, tasks))
+        waves = math.ceil(float(tasks) / machines)
+        return queue_wait + waves * (task_startup + chunk_size * per_frame)
+
+    def class_speeds(self, entries=None):
+        """
+        Mean per-frame time of each worker class across recorded jobs, so slow machines in a pool and group stand
+        out from fast ones.
+        :return: dict of worker class: per-frame seconds
+        """
+        totals = {}
+        for entry in entries:
+            for name, stats in (entry.get('workers') or {}).items():
+                total = totals.setdefault(name, [0.0, 0])
+                total[0] += stats['per_frame'] * stats['tasks']
+                total[1] += stats['tasks']
+        return dict([(name, total / count) for name, (total, count) in totals.items() if count])
+
+    def recommend(self, frames=None, complexity=1.0, pools=None, current=None):
+        """
+        Picks the pool, group, machine limit and chunk size with the lowest expected turnaround for a new job.
+        :param frames: Number of frames in the new job
+        :param complexity: Scene complexity, in the same units as recorded jobs
+        :param pools: Pools that currently exist.  Others in the history are ignored.
+        :param current: dict of the pool, group, machine_limit and chunk_size the job would otherwise go out with.
+                        The recommendation has to beat these by a real margin to replace them.
+        :return: dict of pool, group, machine_limit, chunk_size, estimate (seconds) and worker_speeds, the per-frame
+                 time of each worker class in the pool and group, or None without history
+        """
+        with self._lock:
+            records = list(self.records)
+        grouped = {}
+        for entry in records:
+            if pools and entry['pool'] not in pools:
+                continue
+            grouped.setdefault((entry['pool'], entry['group']), []).append(entry)
+
+        best = None
+        for (pool, group), entries in grouped.items():
+            if len(entries) < min_samples:
+                continue
+            for limit in machine_limits:
+                chunk_size = int(math.ceil(float(frames) / limit))
+                machines = min(limit, int(math.ceil(float(frames) / chunk_size)))
+                estimate = self.turnaround(entries, frames, complexity, machines, chunk_size)
+                # Fewer machines win a tie.
+                if best is None or (estimate, machines) < (best['estimate'], best['machine_limit']):
+                    best = {
+                        'pool': pool,
+                        'group': group,
+                        'machine_limit': machines,
+                        'chunk_size': chunk_size,
+                        'estimate': estimate
+                    }
+        if best and current:
+            entries = grouped.get((current['pool'], current['group']))
+            if entries and len(entries) >= min_samples:
+                current = dict(current)
+                current['estimate'] = self.turnaround(entries, frames, complexity, current['machine_limit'],
+                                                      current['chunk_size'])
+                # Only move the job when it buys a real improvement.
+                if best['estimate'] >= current['estimate'] * 0.95:
+                    best = current
+        if best:
+            best['worker_speeds'] = self.class_speeds(grouped.get((best['pool'], best['group']), []))
+        return best
@@ -0,0 +1,140 @@
+# Copyright (c) 2013 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+import os
+import subprocess
+import sgtk
+from sgtk.platform.qt import QtCore, QtGui
+from .sequence_index import frame_pattern, sequence_frames
+
+logger = sgtk.platform.get_logger(__name__)
+
+thumbnail_width = 640
+# Shotgun plays filmstrips back as a strip of 240 pixel wide frames
+filmstrip_frame_width = 240
+filmstrip_frames = 16
+proxy_width = 960
+proxy_fps = 24
+
+
+def pick_frames(frames=None, count=None):
+    """
+    Evenly spaced frames across the sequence, first and last included.
+    """
+    if len(frames) <= count:
+        return list(frames)
+    step = (len(frames) - 1) / float(count - 1)
+    return [frames[int(round(index * step))] for index in range(count)]
+
+
+def read_scaled(path=None, width=None):
+    """
+    Decodes an image straight to the given width.  The reader scales while decoding, so a full resolution frame is
+    never held in memory.
+    :return: QImage, null if it could not be read
+    """
+    reader = QtGui.QImageReader(path)
+    size = reader.size()
+    if size.isValid() and size.width() > width:
+        reader.setScaledSize(QtCore.QSize(width, max(1, int(round(size.height() * float(width) / size.width())))))
+    image = reader.read()
+    if image.isNull():
+        logger.warning('Could not read %s: %s' % (path, reader.errorString()))
+    return image
+
+
+def make_thumbnail(frames=None, out_path=None):
+    """
+    Writes the middle frame, scaled down, as the thumbnail.
+    """
+    frame, path = frames[len(frames) // 2]
+    image = read_scaled(path, thumbnail_width)
+    if image.isNull() or not image.save(out_path, 'JPG', 85):
+        return None
+    return out_path
+
+
+def make_filmstrip(frames=None, out_path=None):
+    """
+    Writes a Shotgun filmstrip: picked frames side by side, each 240 pixels wide.
+    """
+    images = [read_scaled(path, filmstrip_frame_width) for frame, path in pick_frames(frames, filmstrip_frames)]
+    images = [image for image in images if not image.isNull()]
+    if not images:
+        return None
+    height = images[0].height()
+    strip = QtGui.QImage(filmstrip_frame_width * len(images), height, QtGui.QImage.Format_RGB32)
+    strip.fill(QtGui.QColor(0, 0, 0))
+    painter = QtGui.QPainter(strip)
+    for index, image in enumerate(images):
+        painter.drawImage(index * filmstrip_frame_width, 0, image)
+    painter.end()
+    if not strip.save(out_path, 'JPG', 85):
+        return None
+    return out_path
+
+
+def make_proxy_movie(pattern=None, frames=None, out_path=None, ffmpeg=None):
+    """
+    Encodes a small H.264 movie of the sequence with ffmpeg.
+    """
+    match = frame_pattern.search(pattern)
+    if not match or not frames:
+        return None
+    padding = len(match.group(1)) if match.group(1).startswith('#') else int(match.group(2))
+    source = '%s%%0%id%s' % (pattern[:match.start()], padding, pattern[match.end():])
+    command = [ffmpeg, '-y', '-loglevel', 'error', '-framerate', str(proxy_fps), '-start_number', str(frames[0][0]),
+               '-i', source, '-vf', 'scale=%i:-2' % proxy_width, '-c:v', 'libx264', '-pix_fmt', 'yuv420p',
+               '-crf', '23', out_path]
+    try:
+        process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        output = process.communicate()[0]
+    except OSError, e:
+        logger.warning('ffmpeg could not be run: %s' % e)
+        return None
+    if process.returncode:
+        logger.warning('The proxy movie failed: %s' % output)
+        return None
+    return out_path
+
+
+def review_paths(pattern=None):
+    """
+    Where review_media writes the thumbnail, filmstrip and movie of a sequence: a review folder beside the frames.
+    """
+    review_dir = os.path.join(os.path.dirname(pattern), 'review')
+    base_name = frame_pattern.sub('', os.path.basename(pattern)).rsplit('.', 1)[0].rstrip('._')
+    return {
+        'thumbnail': os.path.join(review_dir, '%s_thumb.jpg' % base_name),
+        'filmstrip': os.path.join(review_dir, '%s_filmstrip.jpg' % base_name),
+        'movie': os.path.join(review_dir, '%s_proxy.mov' % base_name)
+    }
+
+
+def review_media(pattern=None, ffmpeg=None):
+    """
+    Builds the lightweight media Shotgun gets for an image sequence blast: a thumbnail, a filmstrip and, when
+    ffmpeg is available, a proxy movie.  Everything is written to a review folder beside the frames.
+    :return: dict of thumbnail, filmstrip and movie paths, None where one could not be made
+    """
+    media = {'thumbnail': None, 'filmstrip': None, 'movie': None}
+    frames = sequence_frames(pattern)
+    if not frames:
+        logger.warning('No frames found for %s' % pattern)
+        return media
+    paths = review_paths(pattern)
+    review_dir = os.path.dirname(paths['movie'])
+    if not os.path.exists(review_dir):
+        os.makedirs(review_dir)
+    media['thumbnail'] = make_thumbnail(frames, paths['thumbnail'])
+    media['filmstrip'] = make_filmstrip(frames, paths['filmstrip'])
+    if ffmpeg and frames[0][0] is not None:
+        media['movie'] = make_proxy_movie(pattern, frames, paths['movie'], ffmpeg)
+    return media
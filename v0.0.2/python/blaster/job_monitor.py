@@ -0,0 +1,235 @@
+# Copyright (c) 2013 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+import os
+import threading
+import sgtk
+from sgtk.platform.qt import QtCore, QtGui
+
+logger = sgtk.platform.get_logger(__name__)
+
+# Deadline job "Stat" values
+job_states = {
+    0: 'Unknown',
+    1: 'Active',
+    2: 'Suspended',
+    3: 'Completed',
+    4: 'Failed',
+    6: 'Pending'
+}
+finished_states = ['Completed', 'Failed']
+# Deadline task "Stat" values
+task_states = {
+    1: 'Unknown',
+    2: 'Queued',
+    3: 'Suspended',
+    4: 'Rendering',
+    5: 'Completed',
+    6: 'Failed',
+    8: 'Pending'
+}
+
+min_interval = 5.0
+max_interval = 120.0
+backoff = 1.5
+
+_monitor = None
+_tray = None
+
+
+def get_job_monitor(dl=None):
+    """
+    Returns the shared job monitor.  It outlives the dialog, so jobs keep being watched after Blaster closes.
+    """
+    global _monitor
+    if _monitor is None:
+        _monitor = JobMonitor(dl)
+    elif dl is not None:
+        _monitor.dl = dl
+    return _monitor
+
+
+def notify(title=None, message=None):
+    """
+    Pops a system tray message.
+    """
+    global _tray
+    if not QtGui.QSystemTrayIcon.isSystemTrayAvailable():
+        logger.info('%s: %s' % (title, message))
+        return
+    if _tray is None:
+        icon_path = os.path.join(os.path.dirname(__file__), 'resources', 'blaster.png')
+        _tray = QtGui.QSystemTrayIcon(QtGui.QIcon(icon_path))
+        _tray.show()
+    _tray.showMessage(title, message)
+
+
+def summarize_job(job=None):
+    """
+    Boils a Deadline job document down to what Blaster shows.
+    """
+    props = job.get('Props', {})
+    total = props.get('Tasks') or 0
+    completed = job.get('CompletedChunks', 0)
+    status = job_states.get(job.get('Stat'), 'Unknown')
+    progress = 0
+    if total:
+        progress = int(100.0 * completed / total)
+    return {
+        'id': job.get('_id'),
+        'name': props.get('Name'),
+        'status': status,
+        'completed': completed,
+        'rendering': job.get('RenderingChunks', 0),
+        'failed': job.get('FailedChunks', 0),
+        'total': total,
+        'errors': job.get('Errs', 0),
+        'progress': progress,
+        'tasks': [],
+        'job': job
+    }
+
+
+def summarize_tasks(summary=None, tasks=None):
+    """
+    Adds a job's tasks to its summary, and works its progress out from them, so a half rendered chunk counts for
+    half rather than nothing.
+    """
+    if isinstance(tasks, dict):
+        tasks = tasks.get('Tasks')
+    rows = []
+    for task in tasks or []:
+        status = task_states.get(task.get('Stat'), 'Unknown')
+        if status == 'Completed':
+            progress = 100
+        else:
+            try:
+                progress = int(float(str(task.get('Prog') or 0).strip(' %')))
+            except ValueError:
+                progress = 0
+        rows.append({
+            'id': task.get('TaskID'),
+            'frames': task.get('Frames'),
+            'status': status,
+            'progress': progress,
+            'errors': task.get('Errs', 0),
+            'worker': task.get('Slave'),
+            'started': task.get('StartRen'),
+            'finished': task.get('Comp')
+        })
+    summary['tasks'] = rows
+    if rows:
+        summary['progress'] = int(sum([row['progress'] for row in rows]) / float(len(rows)))
+    return summary
+
+
+class JobMonitor(QtCore.QObject):
+    """
+    Watches submitted Blaster jobs from a background thread.
+
+    All watched jobs are queried in one request per poll, and the tasks of the ones rendering in one more each.  The
+    poll interval starts short and backs off while
+    nothing changes, and drops back down whenever a job moves or a new one is added.
+    """
+    job_updated = QtCore.Signal(dict)
+    job_finished = QtCore.Signal(dict)
+
+    def __init__(self, dl=None):
+        QtCore.QObject.__init__(self)
+        self.dl = dl
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._interval = min_interval
+        self._thread = None
+        # The monitor lives on the main thread, so this is queued there and the tray is never touched from the
+        # polling thread.
+        self.job_finished.connect(self._notify_finished)
+
+    def _notify_finished(self, summary=None):
+        if summary['status'] == 'Completed':
+            notify('Blaster', '%s has finished.' % summary['name'])
+        else:
+            notify('Blaster', '%s failed with %s errors.' % (summary['name'], summary['errors']))
+
+    def watch(self, job_id=None, name=None):
+        if not job_id:
+            return
+        with self._lock:
+            self._jobs[job_id] = {'id': job_id, 'name': name, 'status': 'Submitted', 'completed': 0, 'progress': 0}
+            self._interval = min_interval
+        self._start()
+        self._wake.set()
+
+    def watched(self):
+        with self._lock:
+            return dict(self._jobs)
+
+    def _start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._run, name='BlasterJobMonitor')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._lock:
+                job_ids = list(self._jobs.keys())
+            if not job_ids:
+                # Nothing left to watch.  Park until the next submission.
+                self._wake.wait()
+                self._wake.clear()
+                continue
+            try:
+                self.poll(job_ids)
+            except Exception, e:
+                logger.warning('Deadline job poll failed: %s' % e)
+                self._interval = min(self._interval * backoff, max_interval)
+            self._wake.wait(self._interval)
+            self._wake.clear()
+
+    def poll(self, job_ids=None):
+        jobs = self.dl.Jobs.GetJobs(job_ids) or []
+        changed = False
+        returned = [job.get('_id') for job in jobs]
+        with self._lock:
+            for job_id in job_ids:
+                if job_id not in returned and job_id in self._jobs:
+                    # Deleted or archived from the Monitor.
+                    logger.debug('Job %s is gone from Deadline, no longer watching it.' % job_id)
+                    del self._jobs[job_id]
+        for job in jobs:
+            summary = summarize_job(job)
+            # Finished jobs' tasks say which workers rendered them, for the farm history.
+            if summary['status'] == 'Active' or summary['status'] in finished_states:
+                try:
+                    summarize_tasks(summary, self.dl.Tasks.GetJobTasks(summary['id']))
+                except Exception, e:
+                    logger.debug('Could not get the tasks of job %s: %s' % (summary['id'], e))
+            with self._lock:
+                previous = self._jobs.get(summary['id'])
+                if previous is None:
+                    continue
+                if previous['status'] == summary['status'] and previous['completed'] == summary['completed'] \
+                        and previous['progress'] == summary['progress']:
+                    continue
+                changed = True
+                if summary['status'] in finished_states:
+                    del self._jobs[summary['id']]
+                else:
+                    self._jobs[summary['id']] = summary
+            self.job_updated.emit(summary)
+            if summary['status'] in finished_states:
+                self.job_finished.emit(summary)
+        if changed:
+            self._interval = min_interval
+        else:
+            self._interval = min(self._interval * backoff, max_interval)
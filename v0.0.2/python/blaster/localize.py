@@ -0,0 +1,236 @@
+# Copyright (c) 2013 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+Worker side cache of scene and reference files.
+
+Runs inside the farm worker's Maya, outside of Toolkit, so it only uses the standard library.  Files are stored by
+content hash, so the same asset referenced from different shots is only kept once.  A path whose size and
+modification time haven't changed since it was last seen is served without touching the network at all.
+"""
+
+import os
+import json
+import time
+import uuid
+import errno
+import shutil
+import hashlib
+import logging
+
+logger = logging.getLogger('blaster.localize')
+
+chunk_size = 4 * 1024 * 1024
+index_name = 'index.json'
+lock_timeout = 60.0
+# The index lock is only held to read, change and write the index, so one older than this was left by a dead task.
+stale_lock = 30.0
+# A blast that died without releasing its files stops pinning them after this long.
+pin_timeout = 12 * 60 * 60
+
+
+class IndexLock(object):
+    """
+    Lock file shared by every task on the worker, so only one of them changes the index at a time.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+
+    def __enter__(self):
+        start = time.time()
+        while True:
+            try:
+                handle = os.open(self.path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+                os.write(handle, ('%s' % os.getpid()).encode('ascii'))
+                os.close(handle)
+                return self
+            except OSError, e:
+                if e.errno != errno.EEXIST:
+                    raise
+            try:
+                if time.time() - os.path.getmtime(self.path) > stale_lock:
+                    logger.warning('Breaking stale cache lock %s' % self.path)
+                    os.remove(self.path)
+                    continue
+            except OSError:
+                # Released while we looked.
+                continue
+            if time.time() - start > lock_timeout:
+                raise IOError('Timed out waiting for %s' % self.path)
+            time.sleep(0.05)
+
+    def __exit__(self, *args):
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+
+class LocalCache(object):
+    """
+    Content-hash file cache on a worker's local disk, evicted least recently used first once it passes max_bytes.
+
+    Copies keep their extension, since Maya reads a scene's type from it, so content seen under two extensions is
+    kept once per extension.  The index tracks every copy of a hash, and eviction removes them together.
+
+    Several tasks can share one cache.  Changes to the index are made under a lock file and on top of the index as
+    last saved, and the files a blast has opened are pinned in the index until it releases them, so another task's
+    eviction never removes them.
+    """
+
+    def __init__(self, root=None, max_bytes=None):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.index_path = os.path.join(root, index_name)
+        self.index = {'paths': {}, 'blobs': {}, 'pins': {}}
+        # One owner per blast, even when a warm worker runs many in the same process.
+        self.owner = '%s.%s' % (os.getpid(), uuid.uuid4().hex[:8])
+        if not os.path.exists(root):
+            os.makedirs(root)
+        self.load()
+
+    def load(self):
+        if os.path.exists(self.index_path):
+            try:
+                with open(self.index_path) as index:
+                    self.index = json.load(index)
+            except (IOError, ValueError), e:
+                logger.warning('Cache index unreadable, starting over: %s' % e)
+        for key in ['paths', 'blobs', 'pins']:
+            self.index.setdefault(key, {})
+        for blob in self.index['blobs'].values():
+            # Indexes from before a hash could have several copies
+            if 'exts' not in blob:
+                blob['exts'] = [blob.pop('ext', '')]
+
+    def save(self):
+        temp_path = '%s.%s.tmp' % (self.index_path, self.owner)
+        with open(temp_path, 'w') as index:
+            json.dump(self.index, index)
+        if os.path.exists(self.index_path):
+            os.remove(self.index_path)
+        os.rename(temp_path, self.index_path)
+
+    def locked(self):
+        return IndexLock('%s.lock' % self.index_path)
+
+    def blob_path(self, content_hash=None, ext=None):
+        return os.path.join(self.root, content_hash[:2], '%s%s' % (content_hash, ext)).replace('\\', '/')
+
+    def localize(self, path=None):
+        """
+        Returns a local copy of path, copying it in if needed.  Falls back to the original path on any error, so a
+        full cache disk never fails a blast.
+        """
+        try:
+            return self._localize(path)
+        except Exception, e:
+            logger.warning('Could not localize %s, using it in place: %s' % (path, e))
+            return path
+
+    def _localize(self, path=None):
+        stat = os.stat(path)
+        ext = os.path.splitext(path)[1]
+        with self.locked():
+            self.load()
+            known = self.index['paths'].get(path)
+            if known and known['size'] == stat.st_size and known['mtime'] == stat.st_mtime:
+                local_path = self.blob_path(known['hash'], ext)
+                if os.path.exists(local_path):
+                    self._pin(known['hash'])
+                    self.save()
+                    logger.info('Cache hit: %s' % path)
+                    return local_path
+
+        # Copy and hash in the same pass, so the network is only read once.  Other tasks carry on meanwhile.
+        temp_path = os.path.join(self.root, 'incoming_%s_%s%s' % (self.owner, int(time.time() * 1000), ext))
+        sha = hashlib.sha1()
+        with open(path, 'rb') as source:
+            with open(temp_path, 'wb') as target:
+                while True:
+                    chunk = source.read(chunk_size)
+                    if not chunk:
+                        break
+                    sha.update(chunk)
+                    target.write(chunk)
+        shutil.copystat(path, temp_path)
+        content_hash = sha.hexdigest()
+        local_path = self.blob_path(content_hash, ext)
+        with self.locked():
+            self.load()
+            if os.path.exists(local_path):
+                # Same content under another path, or another task copied it in first.
+                os.remove(temp_path)
+                logger.info('Cache hit by content: %s' % path)
+            else:
+                if not os.path.exists(os.path.dirname(local_path)):
+                    os.makedirs(os.path.dirname(local_path))
+                os.rename(temp_path, local_path)
+                logger.info('Cached %s' % path)
+            self.index['paths'][path] = {'size': stat.st_size, 'mtime': stat.st_mtime, 'hash': content_hash}
+            blob = self.index['blobs'].setdefault(content_hash, {'size': stat.st_size, 'exts': []})
+            if ext not in blob['exts']:
+                blob['exts'].append(ext)
+            blob['last_used'] = time.time()
+            self._pin(content_hash)
+            self.evict()
+            self.save()
+        return local_path
+
+    def _pin(self, content_hash=None):
+        self.index['pins'].setdefault(content_hash, {})[self.owner] = time.time()
+        self.index['blobs'][content_hash]['last_used'] = time.time()
+
+    def release(self):
+        """
+        Unpins every file this blast opened.  Called once the playblast is done.
+        """
+        try:
+            with self.locked():
+                self.load()
+                for content_hash, owners in self.index['pins'].items():
+                    owners.pop(self.owner, None)
+                    if not owners:
+                        del self.index['pins'][content_hash]
+                self.save()
+        except Exception, e:
+            logger.warning('Could not release cached files: %s' % e)
+
+    def pinned(self, content_hash=None):
+        now = time.time()
+        return any([now - pinned < pin_timeout for pinned in self.index['pins'].get(content_hash, {}).values()])
+
+    def evict(self):
+        """
+        Removes least recently used files past the size limit.  Only call with the index locked.
+        """
+        blobs = self.index['blobs']
+        total = sum([b['size'] * len(b['exts']) for b in blobs.values()])
+        if not self.max_bytes or total <= self.max_bytes:
+            return
+        for content_hash, blob in sorted(blobs.items(), key=lambda item: item[1]['last_used']):
+            if total <= self.max_bytes:
+                break
+            if self.pinned(content_hash):
+                # In use by a blast on this worker.
+                continue
+            for ext in blob['exts']:
+                try:
+                    os.remove(self.blob_path(content_hash, ext))
+                except OSError:
+                    pass
+            total -= blob['size'] * len(blob['exts'])
+            del blobs[content_hash]
+            self.index['pins'].pop(content_hash, None)
+            for path, known in self.index['paths'].items():
+                if known['hash'] == content_hash:
+                    del self.index['paths'][path]
+            logger.info('Evicted %s' % content_hash)
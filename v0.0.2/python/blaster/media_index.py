@@ -0,0 +1,104 @@
+# Copyright (c) 2013 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+import os
+import json
+import time
+import hashlib
+import threading
+import sgtk
+
+logger = sgtk.platform.get_logger(__name__)
+
+chunk_size = 4 * 1024 * 1024
+max_entries = 500
+
+
+class MediaIndex(object):
+    """
+    Remembers which Shotgun entity already holds an uploaded copy of a file, by content hash.
+
+    Files are hashed in one streaming pass, and hashes are remembered by path, size and modification time so a file
+    is only read once.  Entries are keyed on the hash and how it was uploaded (the field, or thumbnail or filmstrip),
+    since the same image can be both.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.index = {'files': {}, 'media': {}}
+        self._lock = threading.Lock()
+        self.load()
+
+    def load(self):
+        if self.path and os.path.exists(self.path):
+            try:
+                with open(self.path) as index:
+                    self.index = json.load(index)
+            except (IOError, ValueError), e:
+                logger.warning('Media index could not be read: %s' % e)
+
+    def save(self):
+        directory = os.path.dirname(self.path)
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        for key in ['files', 'media']:
+            entries = self.index[key]
+            if len(entries) > max_entries:
+                for old in sorted(entries, key=lambda k: entries[k]['time'])[:len(entries) - max_entries]:
+                    del entries[old]
+        temp_path = '%s.tmp' % self.path
+        with open(temp_path, 'w') as index:
+            json.dump(self.index, index)
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        os.rename(temp_path, self.path)
+
+    def _save(self):
+        try:
+            self.save()
+        except (IOError, OSError), e:
+            logger.warning('Media index could not be saved: %s' % e)
+
+    def file_hash(self, file_path=None):
+        stat = os.stat(file_path)
+        with self._lock:
+            known = self.index['files'].get(file_path)
+        if known and known['size'] == stat.st_size and known['mtime'] == stat.st_mtime:
+            return known['hash']
+        sha = hashlib.sha1()
+        with open(file_path, 'rb') as media:
+            while True:
+                chunk = media.read(chunk_size)
+                if not chunk:
+                    break
+                sha.update(chunk)
+        with self._lock:
+            self.index['files'][file_path] = {'size': stat.st_size, 'mtime': stat.st_mtime,
+                                              'hash': sha.hexdigest(), 'time': time.time()}
+        return sha.hexdigest()
+
+    def lookup(self, file_hash=None, slot=None):
+        """
+        :param slot: The field the file went to, or thumbnail or filmstrip
+        :return: dict of entity_type and entity_id holding the upload, or None
+        """
+        with self._lock:
+            return self.index['media'].get('%s:%s' % (file_hash, slot))
+
+    def record(self, file_hash=None, slot=None, entity_type=None, entity_id=None):
+        with self._lock:
+            self.index['media']['%s:%s' % (file_hash, slot)] = {'entity_type': entity_type, 'entity_id': entity_id,
+                                                               'time': time.time()}
+            self._save()
+
+    def forget(self, file_hash=None, slot=None):
+        with self._lock:
+            self.index['media'].pop('%s:%s' % (file_hash, slot), None)
+            self._save()
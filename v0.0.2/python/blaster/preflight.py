@@ -0,0 +1,159 @@
+# Copyright (c) 2013 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+import os
+import sys
+import time
+import sgtk
+
+logger = sgtk.platform.get_logger(__name__)
+
+# Rough bytes per pixel of a playblast frame on disk, by image format or movie encoding, in lower case.  Errs high.
+bytes_per_pixel = {
+    'jpg': 0.4,
+    'jpeg': 0.4,
+    'png': 2.0,
+    'gif': 1.0,
+    'bmp': 3.0,
+    'tif': 3.0,
+    'iff': 4.0,
+    'sgi': 3.0,
+    'tga': 3.0,
+    'exr': 6.0,
+    'h.264': 0.1,
+    'mpeg-4': 0.2,
+    'animation': 2.0,
+    'jpeg2000': 0.5,
+    'none': 3.0
+}
+default_bytes_per_pixel = 3.0
+# Room left over on top of the estimate
+headroom = 1.25
+sample_bytes = 8 * 1024 * 1024
+
+
+def estimate_size(width=None, height=None, scale=100, encoding=None, frames=1):
+    """
+    Estimates what a blast will take on disk.
+    :param scale: Playblast percent
+    :param encoding: Image format or movie encoding, as the dialog names it
+    :return: Bytes
+    """
+    pixels = width * height * (scale / 100.0) ** 2
+    return int(pixels * bytes_per_pixel.get(('%s' % encoding).lower(), default_bytes_per_pixel) * frames)
+
+
+def existing_parent(path=None):
+    path = os.path.abspath(path)
+    while not os.path.exists(path):
+        parent = os.path.dirname(path)
+        if parent == path:
+            break
+        path = parent
+    return path
+
+
+def free_space(path=None):
+    """
+    :return: Bytes free to the user on the volume holding path, or None if it can't be told
+    """
+    path = existing_parent(path)
+    try:
+        if sys.platform == 'win32':
+            import ctypes
+            free = ctypes.c_ulonglong(0)
+            if not ctypes.windll.kernel32.GetDiskFreeSpaceExW(ctypes.c_wchar_p(path), ctypes.byref(free), None,
+                                                              None):
+                return None
+            return free.value
+        stat = os.statvfs(path)
+        return stat.f_bavail * stat.f_frsize
+    except (OSError, AttributeError), e:
+        logger.debug('Could not get free space on %s: %s' % (path, e))
+        return None
+
+
+def write_throughput(directory=None, size=sample_bytes):
+    """
+    Times writing a sample file, synced to disk, into directory.
+    :return: Bytes per second, or None if it could not be written
+    """
+    sample = os.path.join(directory, '.blaster_preflight_%s' % os.getpid())
+    block = os.urandom(1024 * 1024)
+    try:
+        start = time.time()
+        with open(sample, 'wb') as writer:
+            for _ in range(max(1, size // len(block))):
+                writer.write(block)
+            writer.flush()
+            os.fsync(writer.fileno())
+        elapsed = max(time.time() - start, 0.001)
+    except (IOError, OSError), e:
+        logger.debug('Could not sample writes to %s: %s' % (directory, e))
+        return None
+    finally:
+        if os.path.exists(sample):
+            try:
+                os.remove(sample)
+            except OSError:
+                pass
+    return max(1, size // len(block)) * len(block) / elapsed
+
+
+def preflight(target=None, estimate=None, scratch_root=None, min_throughput=None, on_scratch=False):
+    """
+    Checks the target volume, and scratch, can take a blast before it starts.
+
+    A blast on scratch is moved to the target afterwards, so the target has to hold it either way.  Scratch is only
+    a way round a slow target, and its own space is checked whenever the blast is written there.
+
+    :param target: Where the blast is going
+    :param estimate: Bytes it should take
+    :param scratch_root: Local scratch folder, if there is one
+    :param min_throughput: Slowest acceptable write speed to the target, in bytes per second
+    :param on_scratch: The blast goes to scratch_root whatever the target is like
+    :return: dict of action (ok, warn, scratch, direct or abort), message, and the measured free space and
+             throughput.  direct means scratch can't take the blast, so it should go straight to the target.
+    """
+    need = int(estimate * headroom)
+    directory = existing_parent(os.path.dirname(target))
+    check = {
+        'action': 'ok',
+        'message': '',
+        'estimate': estimate,
+        'free': free_space(directory),
+        'throughput': None,
+        'scratch_free': free_space(scratch_root) if scratch_root else None
+    }
+    if check['free'] is not None and check['free'] < need:
+        check['action'] = 'abort'
+        check['message'] = '%s has %.1f GB free, the blast needs about %.1f GB.' % (
+            directory, check['free'] / 1024.0 ** 3, need / 1024.0 ** 3)
+        return check
+    # Unknown free space on scratch is taken on trust when scratch was asked for, and not otherwise.
+    scratch_fits = check['scratch_free'] >= need if check['scratch_free'] is not None else on_scratch
+    if on_scratch:
+        if not scratch_fits:
+            check['action'] = 'direct'
+            check['message'] = 'Scratch %s has %.1f GB free, the blast needs about %.1f GB.  Blasting straight ' \
+                               'to %s.' % (scratch_root, check['scratch_free'] / 1024.0 ** 3, need / 1024.0 ** 3,
+                                           directory)
+        return check
+    if min_throughput:
+        check['throughput'] = write_throughput(directory)
+        if check['throughput'] is not None and check['throughput'] < min_throughput:
+            message = '%s is writing at %.1f MB/s.' % (directory, check['throughput'] / 1024.0 ** 2)
+            if scratch_fits:
+                check['action'] = 'scratch'
+                check['message'] = message + '  Blasting to scratch.'
+            else:
+                check['action'] = 'warn'
+                check['message'] = message
+    return check
@@ -0,0 +1,127 @@
+# Copyright (c) 2013 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+import os
+import threading
+from multiprocessing.pool import ThreadPool
+import sgtk
+from sgtk.platform.qt import QtCore, QtGui
+from .sequence_index import list_frames
+
+logger = sgtk.platform.get_logger(__name__)
+
+proxy_workers = 4
+poll_interval = 0.5
+
+
+def proxy_folder(scale=None):
+    """
+    Proxies sit beside the master frames, in a folder per scale: proxy_50, proxy_25...
+    """
+    return 'proxy_%i' % scale
+
+
+class ProxyWriter(object):
+    """
+    Makes scaled down copies of a sequence's frames as the blast writes them.
+
+    A watcher picks frames up once their size has settled and hands them to a pool.  Each frame is decoded once,
+    at the largest proxy size, and the smaller proxies are scaled from that.  finish() catches up with whatever the
+    watcher didn't get to, and with frames written again since.
+    """
+
+    def __init__(self, pattern=None, scales=None, workers=proxy_workers):
+        self.pattern = pattern
+        self.scales = sorted([int(scale) for scale in scales if 0 < int(scale) < 100], reverse=True)
+        self.directory = os.path.dirname(pattern)
+        self.done = {}
+        self.failed = 0
+        self._seen = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._pool = ThreadPool(workers)
+        self._thread = None
+
+    def start(self):
+        for scale in self.scales:
+            folder = os.path.join(self.directory, proxy_folder(scale))
+            if not os.path.exists(folder):
+                os.makedirs(folder)
+        self._thread = threading.Thread(target=self._watch, name='BlasterProxies')
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def _watch(self):
+        while not self._stop.wait(poll_interval):
+            self._scan(settled_only=True)
+
+    def _scan(self, settled_only=False):
+        for number, path in list_frames(self.pattern):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            state = (stat.st_size, stat.st_mtime)
+            with self._lock:
+                previous = self._seen.get(path)
+                self._seen[path] = state
+                if self.done.get(path) == state:
+                    continue
+                # A frame still being written changes size between polls.
+                if settled_only and previous != state:
+                    continue
+                self.done[path] = state
+            self._pool.apply_async(self.downscale, (path,))
+
+    def downscale(self, path=None):
+        reader = QtGui.QImageReader(path)
+        size = reader.size()
+        if not size.isValid():
+            self._failed(path)
+            return
+        largest = self.scales[0] / 100.0
+        reader.setScaledSize(QtCore.QSize(max(1, int(size.width() * largest)),
+                                          max(1, int(size.height() * largest))))
+        image = reader.read()
+        if image.isNull():
+            self._failed(path)
+            return
+        for scale in self.scales:
+            proxy = image
+            if scale != self.scales[0]:
+                proxy = image.scaled(max(1, int(size.width() * scale / 100.0)),
+                                     max(1, int(size.height() * scale / 100.0)),
+                                     QtCore.Qt.IgnoreAspectRatio, QtCore.Qt.SmoothTransformation)
+            out_path = os.path.join(self.directory, proxy_folder(scale), os.path.basename(path))
+            if not proxy.save(out_path, None, 90):
+                self._failed(path)
+
+    def _failed(self, path=None):
+        with self._lock:
+            self.failed += 1
+            self.done.pop(path, None)
+        logger.warning('Could not make proxies of %s.' % path)
+
+    def finish(self):
+        """
+        Stops watching, makes the proxies still missing and waits for them.
+        :return: dict of scale: proxy sequence pattern
+        """
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+        self._scan()
+        self._pool.close()
+        self._pool.join()
+        if self.failed:
+            logger.warning('%i proxy frames failed.' % self.failed)
+        return dict([(scale, os.path.join(self.directory, proxy_folder(scale), os.path.basename(self.pattern)))
+                     for scale in self.scales])
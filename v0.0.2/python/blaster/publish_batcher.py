@@ -0,0 +1,75 @@
+# Copyright (c) 2013 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+import sgtk
+
+logger = sgtk.platform.get_logger(__name__)
+
+
+class PublishBatcher(object):
+    """
+    Collects the Shotgun writes of one Blaster run and sends them as a single batch request.
+
+    create() hands back an empty dict that is filled in with the new entity once the batch goes out, and any uploads
+    queued against it are passed on to the upload queue with the new id, so they run side by side in the background.
+    """
+
+    def __init__(self, shotgun=None, uploads=None):
+        """
+        :param shotgun: Shotgun connection, or anything with its batch()
+        :param uploads: UploadQueue the media goes to
+        """
+        self.shotgun = shotgun
+        self.uploads = uploads
+        self.requests = []
+        self.pending = []
+
+    def create(self, entity_type=None, data=None, uploads=None):
+        """
+        Queues an entity to create.
+
+        :param uploads: list of dicts of path, and field or kind, to upload to the new entity
+        :return: dict that holds the created entity after commit()
+        """
+        entity = {}
+        self.requests.append({'request_type': 'create', 'entity_type': entity_type, 'data': data})
+        self.pending.append((entity, uploads or []))
+        return entity
+
+    def update(self, entity_type=None, entity_id=None, data=None):
+        """
+        Queues an update of an existing entity.
+        :return: dict that holds the updated entity after commit()
+        """
+        entity = {}
+        self.requests.append({'request_type': 'update', 'entity_type': entity_type, 'entity_id': entity_id,
+                              'data': data})
+        self.pending.append((entity, []))
+        return entity
+
+    def commit(self):
+        """
+        Sends everything queued so far in one request and queues the uploads.
+        :return: list of results, in the order they were queued
+        """
+        if not self.requests:
+            return []
+        requests = self.requests
+        pending = self.pending
+        self.requests = []
+        self.pending = []
+        logger.info('Sending %i Shotgun writes in one batch...' % len(requests))
+        results = self.shotgun.batch(requests)
+        for result, (entity, uploads) in zip(results, pending):
+            entity.update(result)
+            for upload in uploads:
+                self.uploads.add(entity['type'], entity['id'], upload['path'], field=upload.get('field'),
+                                 kind=upload.get('kind', 'upload'))
+        return results
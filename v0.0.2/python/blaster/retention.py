@@ -0,0 +1,213 @@
+# Copyright (c) 2013 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+import os
+import re
+import json
+import time
+import shutil
+import sgtk
+from .imaging import review_media, review_paths
+from .sequence_index import index_path, list_frames
+from .burnin import burnin_folder
+
+logger = sgtk.platform.get_logger(__name__)
+
+index_name = '.blaster_index.json'
+review_folder = 'review'
+# The frame number just before the extension of a sequence frame
+frame_token = re.compile(r'\.(\d+)(\.[^.]+)$')
+
+
+def blast_key(file_name=None):
+    """
+    Name shared by every frame of a blast, with the frame number written as #.
+    """
+    match = frame_token.search(file_name)
+    if not match:
+        return file_name
+    return '%s.%s%s' % (file_name[:match.start()], '#' * len(match.group(1)), match.group(2))
+
+
+def copy_folders(directory=None):
+    """
+    Folders of copies made from the blasts beside them: review media, burn-ins and proxies.
+    """
+    return [name for name in os.listdir(directory) if os.path.isdir(os.path.join(directory, name)) and
+            (name in [review_folder, burnin_folder] or name.startswith('proxy_'))]
+
+
+def scan(directory=None):
+    """
+    Groups a playblast folder into blasts: a movie, a frame sequence, or a folder a farm blast wrote.
+    :return: dict of blast key: {'key', 'paths', 'frames', 'size', 'mtime', 'folder'}
+    """
+    blasts = {}
+    copies = copy_folders(directory)
+    for name in os.listdir(directory):
+        if name.startswith('.') or name in copies or name.endswith('.blaster.json'):
+            continue
+        path = os.path.join(directory, name)
+        stat = os.stat(path)
+        folder = os.path.isdir(path)
+        key = name if folder else blast_key(name)
+        blast = blasts.setdefault(key, {'key': key, 'paths': [], 'frames': 0, 'size': 0, 'mtime': 0,
+                                        'folder': folder})
+        blast['paths'].append(path)
+        blast['mtime'] = max(blast['mtime'], stat.st_mtime)
+        if folder:
+            for root, dirs, files in os.walk(path):
+                for file_name in files:
+                    blast['frames'] += 1
+                    blast['size'] += os.path.getsize(os.path.join(root, file_name))
+        else:
+            blast['frames'] += 1
+            blast['size'] += stat.st_size
+    return blasts
+
+
+def published_paths(shotgun=None, directory=None):
+    """
+    Paths under directory that Shotgun Versions point at.
+    """
+    directory = directory.replace('\\', '/')
+    versions = shotgun.find('Version', [{'filter_operator': 'any', 'filters': [
+        ['sg_path_to_frames', 'starts_with', directory],
+        ['sg_path_to_movie', 'starts_with', directory]
+    ]}], ['sg_path_to_frames', 'sg_path_to_movie']) or []
+    paths = set()
+    for version in versions:
+        for field in ['sg_path_to_frames', 'sg_path_to_movie']:
+            if version.get(field):
+                paths.add(version[field].replace('\\', '/'))
+    return paths
+
+
+def is_published(blast=None, published=None):
+    for path in blast['paths']:
+        path = path.replace('\\', '/')
+        for published_path in published:
+            if published_path == path or published_path.startswith(path + '/'):
+                return True
+            if not blast['folder'] and blast_key(os.path.basename(published_path)) == blast['key']:
+                return True
+            # Blaster publishes local blasts by the name it handed playblast, before the frame number was added.
+            if os.path.basename(path).startswith(os.path.basename(published_path) + '.'):
+                return True
+    return False
+
+
+class RetentionPolicy(object):
+    """
+    Keeps a playblast folder from growing forever.
+
+    The latest keep_latest blasts and anything published to Shotgun are kept as they are.  Older frame sequences
+    are compacted: once a proxy movie of them is in the review folder, their frames are removed.  Movies are
+    already compact and are left alone, and so are folders farm blasts wrote and anything a proxy can't be made
+    for.  Every pass writes an index of the folder, so tools can list it without walking every frame.  With no
+    keep_latest, nothing is compacted and the pass only writes the index.
+    """
+
+    def __init__(self, keep_latest=None, shotgun=None, ffmpeg=None, dry_run=False):
+        self.keep_latest = keep_latest
+        self.shotgun = shotgun
+        self.ffmpeg = ffmpeg
+        self.dry_run = dry_run
+
+    def apply(self, directory=None):
+        """
+        :return: The folder's index
+        """
+        blasts = scan(directory)
+        if not self.keep_latest:
+            return self.write_index(directory, blasts, {})
+        published = set()
+        if self.shotgun:
+            try:
+                published = published_paths(self.shotgun, directory)
+            except Exception, e:
+                # Without knowing what's published, nothing can safely be compacted.
+                logger.error('Could not get the published blasts in %s, leaving it alone: %s' % (directory, e))
+                return self.write_index(directory, blasts, {})
+        states = {}
+        ordered = sorted(blasts.values(), key=lambda b: b['mtime'], reverse=True)
+        for position, blast in enumerate(ordered):
+            if position < self.keep_latest:
+                states[blast['key']] = 'latest'
+            elif is_published(blast, published):
+                states[blast['key']] = 'published'
+            elif blast['folder'] or blast['frames'] < 2:
+                states[blast['key']] = 'kept'
+            else:
+                states[blast['key']] = self.compact(directory, blast)
+        return self.write_index(directory, blasts, states)
+
+    def compact(self, directory=None, blast=None):
+        """
+        Swaps a frame sequence for its proxy movie.
+        :return: The blast's new state
+        """
+        pattern = os.path.join(directory, blast['key'])
+        proxy = review_paths(pattern)['movie']
+        if not os.path.exists(proxy) and not self.ffmpeg:
+            return 'kept'
+        if self.dry_run:
+            logger.info('Would compact %s (%i frames, %.1f MB).' % (blast['key'], blast['frames'],
+                                                                    blast['size'] / 1024.0 ** 2))
+            return 'kept'
+        if not os.path.exists(proxy):
+            proxy = review_media(pattern, ffmpeg=self.ffmpeg)['movie']
+            if not proxy:
+                return 'kept'
+        blast['proxy'] = proxy
+        copies = []
+        for folder in copy_folders(directory):
+            if folder != review_folder:
+                copies += [path for number, path in list_frames(os.path.join(directory, folder, blast['key']))]
+        for path in blast['paths'] + copies + [index_path(pattern)]:
+            if not os.path.exists(path):
+                continue
+            try:
+                if os.path.isdir(path):
+                    shutil.rmtree(path)
+                else:
+                    os.remove(path)
+            except OSError, e:
+                logger.warning('Could not remove %s: %s' % (path, e))
+        logger.info('Compacted %s to %s, freeing %.1f MB.' % (blast['key'], proxy,
+                                                              blast['size'] / 1024.0 ** 2))
+        blast['paths'] = []
+        return 'compacted'
+
+    def write_index(self, directory=None, blasts=None, states=None):
+        index = {'updated': time.time(), 'blasts': []}
+        for blast in sorted(blasts.values(), key=lambda b: b['mtime'], reverse=True):
+            index['blasts'].append({
+                'key': blast['key'],
+                'state': states.get(blast['key'], 'kept'),
+                'frames': blast['frames'],
+                'size': blast['size'],
+                'mtime': blast['mtime'],
+                'folder': blast['folder'],
+                'proxy': blast.get('proxy')
+            })
+        if self.dry_run:
+            return index
+        temp_path = os.path.join(directory, '%s.tmp' % index_name)
+        try:
+            with open(temp_path, 'w') as index_file:
+                json.dump(index, index_file, indent=1)
+            path = os.path.join(directory, index_name)
+            if os.path.exists(path):
+                os.remove(path)
+            os.rename(temp_path, path)
+        except (IOError, OSError), e:
+            logger.warning('Could not write the index of %s: %s' % (directory, e))
+        return index
@@ -0,0 +1,156 @@
+# Copyright (c) 2013 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+import os
+import re
+import json
+import time
+import hashlib
+from multiprocessing.pool import ThreadPool
+import sgtk
+from sgtk.platform.qt import QtGui
+
+logger = sgtk.platform.get_logger(__name__)
+
+frame_pattern = re.compile(r'(#+|%0(\d)d)')
+index_version = 1
+hash_workers = 4
+chunk_size = 4 * 1024 * 1024
+
+
+def list_frames(pattern=None):
+    """
+    Finds the frames on disk for a sequence path written with #### or %04d, by listing its folder.
+    :return: Sorted list of (frame number, path)
+    """
+    match = frame_pattern.search(pattern)
+    if not match:
+        return [(None, pattern)] if os.path.exists(pattern) else []
+    padding = len(match.group(1)) if match.group(1).startswith('#') else int(match.group(2))
+    directory = os.path.dirname(pattern)
+    name = re.compile('^%s(\\d{%i,})%s$' % (re.escape(os.path.basename(pattern[:match.start()])), padding,
+                                             re.escape(pattern[match.end():])))
+    frames = []
+    if os.path.isdir(directory):
+        for file_name in os.listdir(directory):
+            found = name.match(file_name)
+            if found:
+                frames.append((int(found.group(1)), os.path.join(directory, file_name)))
+    return sorted(frames)
+
+
+def index_path(pattern=None):
+    """
+    The sidecar index of a sequence sits beside its frames: shot.####.jpg is indexed in shot.jpg.blaster.json.
+    """
+    base_name = frame_pattern.sub('', os.path.basename(pattern)).replace('..', '.').strip('._')
+    return os.path.join(os.path.dirname(pattern), '%s.blaster.json' % base_name)
+
+
+def file_sha1(path=None):
+    sha = hashlib.sha1()
+    with open(path, 'rb') as frame:
+        while True:
+            chunk = frame.read(chunk_size)
+            if not chunk:
+                break
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def write_index(pattern=None, settings_hash=None, checksums=True):
+    """
+    Lists a finished sequence once and writes its index: every frame's number, file name, size and sha1, plus the
+    resolution and the settings it was blasted with.  File names are relative, so the index moves with the frames.
+    :return: The index path, or None if there were no frames
+    """
+    frames = list_frames(pattern)
+    if not frames or frames[0][0] is None:
+        return None
+    sums = [None] * len(frames)
+    if checksums:
+        pool = ThreadPool(min(hash_workers, len(frames)))
+        try:
+            sums = pool.map(file_sha1, [path for number, path in frames])
+        finally:
+            pool.close()
+            pool.join()
+    size = QtGui.QImageReader(frames[0][1]).size()
+    index = {
+        'version': index_version,
+        'pattern': os.path.basename(pattern),
+        'first': frames[0][0],
+        'last': frames[-1][0],
+        'count': len(frames),
+        'resolution': [size.width(), size.height()] if size.isValid() else None,
+        'settings_hash': settings_hash,
+        'written': time.time(),
+        'frames': [{'frame': number, 'file': os.path.basename(path), 'size': os.path.getsize(path), 'sha1': sha}
+                   for (number, path), sha in zip(frames, sums)]
+    }
+    path = index_path(pattern)
+    temp_path = '%s.tmp' % path
+    with open(temp_path, 'w') as index_file:
+        json.dump(index, index_file, separators=(',', ':'))
+    if os.path.exists(path):
+        os.remove(path)
+    os.rename(temp_path, path)
+    return path
+
+
+def read_index(pattern=None):
+    """
+    :return: The sequence's index, or None if it has none
+    """
+    path = index_path(pattern)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path) as index_file:
+            index = json.load(index_file)
+    except (IOError, ValueError), e:
+        logger.warning('Sequence index %s could not be read: %s' % (path, e))
+        return None
+    if index.get('version') != index_version:
+        return None
+    return index
+
+
+def sequence_frames(pattern=None):
+    """
+    The frames of a sequence, from its index when it has one, and by listing its folder when not.
+    :return: Sorted list of (frame number, path)
+    """
+    index = read_index(pattern) if frame_pattern.search(pattern) else None
+    if index is None:
+        return list_frames(pattern)
+    directory = os.path.dirname(pattern)
+    return [(frame['frame'], os.path.join(directory, frame['file'])) for frame in index['frames']]
+
+
+def validate(pattern=None, checksums=False):
+    """
+    Checks the frames on disk against the index.
+    :return: list of (frame number, problem), empty when the sequence is whole
+    """
+    index = read_index(pattern)
+    if index is None:
+        return [(None, 'no index')]
+    directory = os.path.dirname(pattern)
+    problems = []
+    for frame in index['frames']:
+        path = os.path.join(directory, frame['file'])
+        if not os.path.exists(path):
+            problems.append((frame['frame'], 'missing'))
+        elif os.path.getsize(path) != frame['size']:
+            problems.append((frame['frame'], 'size changed'))
+        elif checksums and frame['sha1'] and file_sha1(path) != frame['sha1']:
+            problems.append((frame['frame'], 'checksum changed'))
+    return problems
@@ -0,0 +1,241 @@
+# Copyright (c) 2013 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+import os
+import json
+import copy
+import time
+import threading
+from datetime import datetime, timedelta, tzinfo
+import sgtk
+
+logger = sgtk.platform.get_logger(__name__)
+
+# Seconds a cached read stays good, per entity type
+default_ttls = {
+    'HumanUser': 86400,
+    'Project': 86400,
+    'Shot': 600,
+    'Asset': 600,
+    'Task': 600
+}
+default_ttl = 60
+max_entries = 1000
+# Changes are written out at most this often, rather than on every miss
+save_delay = 2.0
+datetime_format = '%Y-%m-%dT%H:%M:%S.%f'
+
+# Calls that change Shotgun.  Each takes the entity type first, except share_thumbnail, which takes a list of
+# entities.
+write_calls = ['create', 'update', 'delete', 'revive', 'upload', 'upload_thumbnail', 'upload_filmstrip_thumbnail',
+               'share_thumbnail']
+
+
+class UTC(tzinfo):
+    def utcoffset(self, dt):
+        return timedelta(0)
+
+    def dst(self, dt):
+        return timedelta(0)
+
+    def tzname(self, dt):
+        return 'UTC'
+
+
+def encode_value(value=None):
+    """
+    Writes Shotgun's datetimes in a form decode_value can turn back into datetimes.  Aware ones are stored as UTC.
+    """
+    if isinstance(value, datetime):
+        if value.utcoffset() is not None:
+            return {'__datetime__': (value - value.utcoffset()).replace(tzinfo=None).strftime(datetime_format),
+                    'utc': True}
+        return {'__datetime__': value.strftime(datetime_format), 'utc': False}
+    return str(value)
+
+
+def decode_value(value=None):
+    if '__datetime__' not in value:
+        return value
+    decoded = datetime.strptime(value['__datetime__'], datetime_format)
+    if value.get('utc'):
+        decoded = decoded.replace(tzinfo=UTC())
+    return decoded
+
+
+class CachedShotgun(object):
+    """
+    Read-through cache in front of a Shotgun connection.
+
+    find and find_one results are kept per entity type for that type's TTL, in a file shared by every Maya session
+    on the machine, which is written a couple of seconds after a change rather than on every one.  Blaster's own
+    writes through this object drop the cached reads of the entity types they touch.  Everything else goes straight
+    to Shotgun.
+    """
+
+    def __init__(self, connection=None, path=None, ttls=None):
+        """
+        :param connection: Callable returning a Shotgun connection
+        :param path: Cache file
+        :param ttls: dict of entity type: seconds, over the defaults
+        """
+        self.connection = connection
+        self.path = path
+        self.ttls = dict(default_ttls)
+        self.ttls.update(ttls or {})
+        self.hits = 0
+        self.misses = 0
+        self.entries = {}
+        # When each entity type was last invalidated, so entries other sessions cached before that are dropped too
+        self.invalidated = {}
+        self._lock = threading.RLock()
+        self._timer = None
+        self.load()
+
+    def load(self):
+        if self.path and os.path.exists(self.path):
+            try:
+                with open(self.path) as cache:
+                    store = json.load(cache, object_hook=decode_value)
+                self.entries = store['entries']
+                self.invalidated = store['invalidated']
+            except (IOError, ValueError, KeyError), e:
+                logger.warning('Shotgun cache could not be read: %s' % e)
+                self.entries = {}
+                self.invalidated = {}
+
+    def save(self):
+        if not self.path:
+            return
+        with self._lock:
+            # Another Maya may have written since we loaded, keep whichever entry is newer.
+            on_disk = {'entries': {}, 'invalidated': {}}
+            if os.path.exists(self.path):
+                try:
+                    with open(self.path) as cache:
+                        on_disk = json.load(cache, object_hook=decode_value)
+                except (IOError, ValueError):
+                    pass
+            for entity_type, stamp in on_disk.get('invalidated', {}).items():
+                self.invalidated[entity_type] = max(stamp, self.invalidated.get(entity_type, 0))
+            for key, entry in on_disk.get('entries', {}).items():
+                if key not in self.entries or self.entries[key]['time'] < entry['time']:
+                    self.entries[key] = entry
+            now = time.time()
+            for key, entry in self.entries.items():
+                if now - entry['time'] > self._ttl(entry['entity_type']) or \
+                        entry['time'] <= self.invalidated.get(entry['entity_type'], 0):
+                    del self.entries[key]
+            if len(self.entries) > max_entries:
+                for key in sorted(self.entries, key=lambda k: self.entries[k]['time'])[:-max_entries]:
+                    del self.entries[key]
+            directory = os.path.dirname(self.path)
+            if not os.path.exists(directory):
+                os.makedirs(directory)
+            temp_path = '%s.%s.tmp' % (self.path, os.getpid())
+            with open(temp_path, 'w') as cache:
+                json.dump({'entries': self.entries, 'invalidated': self.invalidated}, cache, default=encode_value)
+            if os.path.exists(self.path):
+                os.remove(self.path)
+            os.rename(temp_path, self.path)
+
+    def _changed(self):
+        """
+        Saves a little later, so a burst of misses and invalidations is written out once.
+        """
+        with self._lock:
+            if self._timer is not None:
+                return
+            self._timer = threading.Timer(save_delay, self.flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def flush(self):
+        """
+        Writes out any unsaved changes now.
+        """
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            try:
+                self.save()
+            except (IOError, OSError), e:
+                logger.warning('Shotgun cache could not be saved: %s' % e)
+
+    def _ttl(self, entity_type=None):
+        return self.ttls.get(entity_type, default_ttl)
+
+    def _read(self, method=None, entity_type=None, args=None, kwargs=None):
+        key = json.dumps([method, entity_type, args, kwargs], sort_keys=True, default=str)
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry and time.time() - entry['time'] < self._ttl(entity_type):
+                self.hits += 1
+                # A copy, so a caller changing its records can't change what later readers get.
+                return copy.deepcopy(entry['result'])
+            self.misses += 1
+        # Stamped with when the read went out, so a write landing while it is in flight still invalidates it.
+        started = time.time()
+        result = getattr(self.connection(), method)(entity_type, *args, **kwargs)
+        with self._lock:
+            self.entries[key] = {'entity_type': entity_type, 'time': started, 'result': copy.deepcopy(result)}
+        self._changed()
+        return result
+
+    def find_one(self, entity_type, *args, **kwargs):
+        return self._read('find_one', entity_type, list(args), kwargs)
+
+    def find(self, entity_type, *args, **kwargs):
+        return self._read('find', entity_type, list(args), kwargs)
+
+    def invalidate(self, entity_type=None):
+        """
+        Drops every cached read of an entity type, or all of them.
+        """
+        with self._lock:
+            now = time.time()
+            for key, entry in self.entries.items():
+                if entity_type is None or entry['entity_type'] == entity_type:
+                    self.invalidated[entry['entity_type']] = now
+                    del self.entries[key]
+            if entity_type is not None:
+                self.invalidated[entity_type] = now
+        self._changed()
+
+    def batch(self, requests):
+        result = self.connection().batch(requests)
+        for entity_type in set([request['entity_type'] for request in requests]):
+            self.invalidate(entity_type)
+        return result
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': float(self.hits) / total if total else 0.0
+        }
+
+    def __getattr__(self, name):
+        attr = getattr(self.connection(), name)
+        if name not in write_calls:
+            return attr
+
+        def write(entity_type, *args, **kwargs):
+            result = attr(entity_type, *args, **kwargs)
+            if isinstance(entity_type, list):
+                # share_thumbnail's entities
+                for touched in set([entity['type'] for entity in entity_type]):
+                    self.invalidate(touched)
+            else:
+                self.invalidate(entity_type)
+            return result
+        return write
@@ -0,0 +1,151 @@
+# Copyright (c) 2013 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+import os
+import json
+import time
+import threading
+import sgtk
+
+logger = sgtk.platform.get_logger(__name__)
+
+# Upper edges of the latency histogram buckets, in milliseconds.  Anything slower lands in the last one.
+latency_buckets = [10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000]
+
+# Calls that send a file, and the position of the path in their arguments
+upload_calls = {
+    'upload': 2,
+    'upload_thumbnail': 2,
+    'upload_filmstrip_thumbnail': 2
+}
+
+
+def payload_size(value=None):
+    try:
+        return len(json.dumps(value, default=str))
+    except (TypeError, ValueError):
+        return 0
+
+
+class ShotgunMetrics(object):
+    """
+    Call counts, latency histograms and payload sizes of the Shotgun calls made during one Blaster run.
+    """
+
+    def __init__(self):
+        self.started = time.time()
+        self.methods = {}
+        self.path = None
+        self._lock = threading.Lock()
+
+    def wrap(self, shotgun=None):
+        """
+        :return: The connection, with every call recorded here
+        """
+        return InstrumentedShotgun(shotgun, self)
+
+    def record(self, method=None, seconds=None, sent=0, received=0, failed=False):
+        milliseconds = seconds * 1000.0
+        bucket = len(latency_buckets)
+        for index, edge in enumerate(latency_buckets):
+            if milliseconds <= edge:
+                bucket = index
+                break
+        with self._lock:
+            stats = self.methods.setdefault(method, {
+                'calls': 0,
+                'failures': 0,
+                'total_ms': 0.0,
+                'max_ms': 0.0,
+                'histogram': [0] * (len(latency_buckets) + 1),
+                'bytes_sent': 0,
+                'bytes_received': 0
+            })
+            stats['calls'] += 1
+            stats['failures'] += 1 if failed else 0
+            stats['total_ms'] += milliseconds
+            stats['max_ms'] = max(stats['max_ms'], milliseconds)
+            stats['histogram'][bucket] += 1
+            stats['bytes_sent'] += sent
+            stats['bytes_received'] += received
+
+    def over_budget(self, budget=None):
+        """
+        :param budget: dict of method: most calls allowed in a run
+        :return: dict of method: (calls, allowed) for every method over its budget
+        """
+        over = {}
+        with self._lock:
+            for method, allowed in (budget or {}).items():
+                calls = self.methods.get(method, {}).get('calls', 0)
+                if calls > allowed:
+                    over[method] = (calls, allowed)
+        return over
+
+    def report(self, budget=None):
+        with self._lock:
+            methods = json.loads(json.dumps(self.methods))
+        return {
+            'started': self.started,
+            'duration': time.time() - self.started,
+            'latency_buckets_ms': latency_buckets,
+            'methods': methods,
+            'budget': budget or {},
+            'over_budget': self.over_budget(budget)
+        }
+
+    def write(self, directory=None, budget=None):
+        """
+        Writes the run's metrics to a timestamped file and warns about every method over its call budget.  Writing
+        again, once the run's uploads are done, updates the same file.
+        :return: Path of the metrics file
+        """
+        report = self.report(budget)
+        for method, (calls, allowed) in report['over_budget'].items():
+            logger.warning('Blaster made %i Shotgun %s calls, over its budget of %i.' % (calls, method, allowed))
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        if self.path is None:
+            self.path = os.path.join(directory, 'shotgun_%s_%s.json' % (time.strftime('%Y%m%d%H%M%S'), os.getpid()))
+        with open(self.path, 'w') as metrics:
+            json.dump(report, metrics, indent=2)
+        return self.path
+
+
+class InstrumentedShotgun(object):
+    """
+    Stands in for a Shotgun connection and times every method called on it.
+    """
+
+    def __init__(self, shotgun=None, metrics=None):
+        self._shotgun = shotgun
+        self._metrics = metrics
+
+    def __getattr__(self, name):
+        attr = getattr(self._shotgun, name)
+        if not callable(attr):
+            return attr
+
+        def call(*args, **kwargs):
+            sent = payload_size([args, kwargs])
+            if name in upload_calls and len(args) > upload_calls[name]:
+                try:
+                    sent = os.path.getsize(args[upload_calls[name]])
+                except (OSError, TypeError):
+                    pass
+            start = time.time()
+            try:
+                result = attr(*args, **kwargs)
+            except Exception:
+                self._metrics.record(name, time.time() - start, sent=sent, failed=True)
+                raise
+            self._metrics.record(name, time.time() - start, sent=sent, received=payload_size(result))
+            return result
+        return call
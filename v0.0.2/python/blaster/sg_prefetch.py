@@ -0,0 +1,66 @@
+# Copyright (c) 2013 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+import threading
+import sgtk
+
+logger = sgtk.platform.get_logger(__name__)
+
+user_fields = ['login', 'email']
+# Frame range fields per entity type.  Entities not listed here have nothing to fetch.
+entity_fields = {
+    'Shot': ['sg_head_in', 'sg_tail_out']
+}
+
+
+class ContextPrefetcher(object):
+    """
+    Fetches the Shotgun records the dialog needs while the UI is being built.
+
+    Shotgun's batch() only takes writes, and the user and the entity aren't linked to each other, so the reads go
+    out side by side on their own threads instead.  Opening the dialog waits on the slowest single round trip
+    rather than the sum of them.
+    """
+
+    def __init__(self, connection=None, user_id=None, entity_type=None, entity_id=None):
+        """
+        :param connection: Callable returning a Shotgun connection.  Toolkit hands each thread its own.
+        """
+        self.connection = connection
+        self.queries = {
+            'user': ('HumanUser', [['id', 'is', user_id]], user_fields)
+        }
+        if entity_type in entity_fields:
+            self.queries['entity'] = (entity_type, [['id', 'is', entity_id]], entity_fields[entity_type])
+        self.results = {}
+        self._threads = []
+
+    def start(self):
+        for key, query in self.queries.items():
+            thread = threading.Thread(target=self._fetch, args=(key, query), name='BlasterPrefetch-%s' % key)
+            thread.daemon = True
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def _fetch(self, key=None, query=None):
+        try:
+            self.results[key] = self.connection().find_one(*query)
+        except Exception, e:
+            logger.error('Prefetching %s failed: %s' % (query[0], e))
+            self.results[key] = None
+
+    def result(self, timeout=30):
+        """
+        Waits for every query and returns their records by name: user, and entity where it has a frame range.
+        """
+        for thread in self._threads:
+            thread.join(timeout)
+        return self.results
@@ -0,0 +1,161 @@
+# Copyright (c) 2013 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+import os
+import hashlib
+import tempfile
+import threading
+from multiprocessing.pool import ThreadPool
+import sgtk
+
+logger = sgtk.platform.get_logger(__name__)
+
+copy_workers = 4
+chunk_size = 4 * 1024 * 1024
+
+_stager = None
+
+
+def get_output_stager():
+    """
+    Returns the shared stager.  It outlives the dialog, so transfers finish after Blaster closes.
+    """
+    global _stager
+    if _stager is None:
+        _stager = OutputStager()
+    return _stager
+
+
+def scratch_directory(scratch_root=None, name=None):
+    """
+    Makes a fresh folder on local scratch to blast into.
+    """
+    root = os.path.join(os.path.expandvars(scratch_root), 'blaster')
+    if not os.path.exists(root):
+        os.makedirs(root)
+    return tempfile.mkdtemp(prefix='%s_' % name, dir=root)
+
+
+def file_sha1(path=None):
+    sha = hashlib.sha1()
+    with open(path, 'rb') as source:
+        while True:
+            chunk = source.read(chunk_size)
+            if not chunk:
+                break
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def transfer(source=None, destination=None):
+    """
+    Copies a file next to its destination, checks the copy against the source by size and sha1, and only then
+    renames it into place and removes the source.  Readers of the destination never see a partial file.
+    """
+    partial = os.path.join(os.path.dirname(destination), '.%s.partial' % os.path.basename(destination))
+    sha = hashlib.sha1()
+    with open(source, 'rb') as reader:
+        with open(partial, 'wb') as writer:
+            while True:
+                chunk = reader.read(chunk_size)
+                if not chunk:
+                    break
+                sha.update(chunk)
+                writer.write(chunk)
+    if os.path.getsize(partial) != os.path.getsize(source) or file_sha1(partial) != sha.hexdigest():
+        os.remove(partial)
+        raise IOError('%s did not copy cleanly to %s' % (source, destination))
+    if os.path.exists(destination):
+        os.remove(destination)
+    os.rename(partial, destination)
+    os.remove(source)
+    return destination
+
+
+class OutputStager(object):
+    """
+    Moves blasts from local scratch to their place in the pipeline in the background.
+
+    Maya writes the frames at local disk speed, and the copy to shared storage overlaps with whatever the artist
+    does next.  Files are copied in parallel, each one verified before it is renamed into place.
+    """
+
+    def __init__(self, workers=copy_workers):
+        self.workers = workers
+        self.active = {}
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def stage(self, sources=None, destination=None, callback=None):
+        """
+        Starts moving files into a destination folder.
+
+        :param sources: Files on scratch
+        :param destination: Folder they belong in
+        :param callback: Called from the transfer thread with a dict of files, the destination paths moved, and
+                         failed, the sources left on scratch
+        """
+        with self._lock:
+            self._count += 1
+            thread = threading.Thread(target=self._run, args=(list(sources), destination, callback),
+                                      name='BlasterStaging-%i' % self._count)
+            self.active[thread.name] = destination
+        thread.daemon = True
+        thread.start()
+        return thread
+
+    def pending(self):
+        with self._lock:
+            return list(self.active.values())
+
+    def _run(self, sources=None, destination=None, callback=None):
+        result = {'files': [], 'failed': []}
+        try:
+            if not os.path.exists(destination):
+                os.makedirs(destination)
+            pool = ThreadPool(min(self.workers, max(1, len(sources))))
+            try:
+                outcomes = pool.map(self._transfer, [(source, destination) for source in sources])
+            finally:
+                pool.close()
+                pool.join()
+            for source, moved in zip(sources, outcomes):
+                if moved:
+                    result['files'].append(moved)
+                else:
+                    result['failed'].append(source)
+            scratch = set([os.path.dirname(source) for source in sources])
+            for folder in scratch:
+                if os.path.isdir(folder) and not os.listdir(folder):
+                    os.rmdir(folder)
+        except (IOError, OSError), e:
+            logger.error('Staging to %s failed: %s' % (destination, e))
+            result['failed'] = [source for source in sources if os.path.exists(source)]
+        finally:
+            with self._lock:
+                self.active.pop(threading.current_thread().name, None)
+        if result['failed']:
+            logger.error('%i files could not be moved to %s and are still on scratch.' % (len(result['failed']),
+                                                                                         destination))
+        else:
+            logger.info('%i files moved to %s.' % (len(result['files']), destination))
+        if callback:
+            try:
+                callback(result)
+            except Exception, e:
+                logger.error('Staging callback failed: %s' % e)
+
+    def _transfer(self, job=None):
+        source, destination = job
+        try:
+            return transfer(source, os.path.join(destination, os.path.basename(source)))
+        except (IOError, OSError), e:
+            logger.warning('Could not move %s: %s' % (source, e))
+            return None
@@ -0,0 +1,102 @@
+# Copyright (c) 2013 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+import os
+import json
+import time
+import hashlib
+import threading
+import sgtk
+from .blast_script import hash_settings
+
+logger = sgtk.platform.get_logger(__name__)
+
+chunk_size = 4 * 1024 * 1024
+max_entries = 200
+
+
+class SubmissionIndex(object):
+    """
+    Remembers which farm job rendered which blast, so an identical blast can attach to it instead of going to the
+    farm again.
+
+    A blast is identified by the content of the saved scene plus the resolved blast settings, so it only means
+    anything for a scene without unsaved changes.  Scene hashes are remembered by path, size and modification time,
+    so an unchanged scene is only read once.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.index = {'scenes': {}, 'jobs': {}}
+        self._lock = threading.Lock()
+        self.load()
+
+    def load(self):
+        if self.path and os.path.exists(self.path):
+            try:
+                with open(self.path) as index:
+                    self.index = json.load(index)
+            except (IOError, ValueError), e:
+                logger.warning('Submission index could not be read: %s' % e)
+
+    def save(self):
+        directory = os.path.dirname(self.path)
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        for key in ['scenes', 'jobs']:
+            entries = self.index[key]
+            if len(entries) > max_entries:
+                for old in sorted(entries, key=lambda k: entries[k]['time'])[:len(entries) - max_entries]:
+                    del entries[old]
+        temp_path = '%s.tmp' % self.path
+        with open(temp_path, 'w') as index:
+            json.dump(self.index, index)
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        os.rename(temp_path, self.path)
+
+    def scene_hash(self, scene_path=None):
+        stat = os.stat(scene_path)
+        known = self.index['scenes'].get(scene_path)
+        if known and known['size'] == stat.st_size and known['mtime'] == stat.st_mtime:
+            return known['hash']
+        sha = hashlib.sha1()
+        with open(scene_path, 'rb') as scene:
+            while True:
+                chunk = scene.read(chunk_size)
+                if not chunk:
+                    break
+                sha.update(chunk)
+        with self._lock:
+            self.index['scenes'][scene_path] = {'size': stat.st_size, 'mtime': stat.st_mtime,
+                                                'hash': sha.hexdigest(), 'time': time.time()}
+        return sha.hexdigest()
+
+    def fingerprint(self, scene_path=None, settings=None):
+        return hash_settings({'scene': self.scene_hash(scene_path), 'settings': settings})
+
+    def lookup(self, fingerprint=None):
+        return self.index['jobs'].get(fingerprint)
+
+    def record(self, fingerprint=None, job_id=None):
+        with self._lock:
+            self.index['jobs'][fingerprint] = {'job_id': job_id, 'time': time.time()}
+            self._save()
+
+    def forget(self, fingerprint=None):
+        with self._lock:
+            if self.index['jobs'].pop(fingerprint, None) is not None:
+                self._save()
+
+    def _save(self):
+        try:
+            self.save()
+        except (IOError, OSError), e:
+            logger.warning('Submission index could not be saved: %s' % e)
@@ -0,0 +1,85 @@
+# Copyright (c) 2013 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+import threading
+from collections import OrderedDict
+import sgtk
+
+logger = sgtk.platform.get_logger(__name__)
+
+max_entries = 256
+
+_cache = None
+
+
+def get_template_cache(tk=None):
+    """
+    Returns the shared template cache, starting over if the toolkit instance changed.
+    """
+    global _cache
+    if _cache is None or (tk is not None and _cache.tk is not tk):
+        _cache = TemplateCache(tk)
+    return _cache
+
+
+class TemplateCache(object):
+    """
+    Remembers the fields toolkit templates parse out of paths, least recently used first out.
+
+    Parsing a path against a template is the slow part of resolving an output path, and a batch resolves the same
+    work file over and over.  Callers get a copy of the fields, so they can add to them freely.
+    """
+
+    def __init__(self, tk=None):
+        self.tk = tk
+        self.fields = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def template(self, name=None):
+        return self.tk.templates[name]
+
+    def get_fields(self, name=None, path=None):
+        """
+        :return: dict of the fields in path, as template name reads them
+        """
+        key = (name, path)
+        with self._lock:
+            if key in self.fields:
+                fields = self.fields.pop(key)
+                self.fields[key] = fields
+                self.hits += 1
+                return dict(fields)
+            self.misses += 1
+        fields = self.template(name).get_fields(path)
+        with self._lock:
+            self.fields[key] = fields
+            while len(self.fields) > max_entries:
+                self.fields.popitem(last=False)
+        return dict(fields)
+
+    def plan(self, work_name=None, output_name=None, paths=None, extra_fields=None):
+        """
+        Lays out the outputs of a whole batch of work files in one pass.
+
+        :param work_name: Template the work files follow
+        :param output_name: Template of the outputs
+        :param paths: Work files
+        :param extra_fields: Fields added to every output, like the timestamp
+        :return: dict of work file: {'fields': ..., 'path': output path}
+        """
+        output_template = self.template(output_name)
+        layout = {}
+        for path in paths:
+            fields = self.get_fields(work_name, path)
+            fields.update(extra_fields or {})
+            layout[path] = {'fields': fields, 'path': output_template.apply_fields(fields)}
+        return layout
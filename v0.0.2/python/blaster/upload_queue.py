@@ -0,0 +1,362 @@
+# Copyright (c) 2013 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+import os
+import json
+import time
+import uuid
+import atexit
+import threading
+import sgtk
+from sgtk.platform.qt import QtCore
+from .job_monitor import notify
+from .localize import IndexLock
+
+logger = sgtk.platform.get_logger(__name__)
+
+max_attempts = 5
+retry_delay = 10.0
+# Every Maya session marks itself alive in the queue file this often, and takes over the uploads of sessions that
+# closed, or haven't marked themselves alive for session_timeout.
+heartbeat = 60.0
+session_timeout = 300.0
+
+_queue = None
+
+
+def get_upload_queue(path=None, connection=None, workers=2, media_index=None):
+    """
+    Returns the shared upload queue.  It outlives the dialog, so uploads carry on after Blaster closes, and picks
+    back up whatever was left in its queue file the last time Maya closed.
+
+    :param path: Queue file
+    :param connection: Callable returning a Shotgun connection
+    :param workers: Number of upload threads
+    :param media_index: MediaIndex used to skip uploading files Shotgun already has
+    """
+    global _queue
+    if _queue is None:
+        _queue = UploadQueue(path=path, connection=connection, workers=workers, media_index=media_index)
+        _queue.resume()
+        atexit.register(_queue.close)
+    elif connection is not None:
+        _queue.connection = connection
+    return _queue
+
+
+class UploadQueue(QtCore.QObject):
+    """
+    Uploads Blaster's media to Shotgun on a pool of background threads.
+
+    Every upload is written to the queue file before it starts and removed once Shotgun has it, so an upload that
+    fails, or that Maya closes on, is tried again rather than lost.  The Shotgun API sends a file in one request, or
+    in parts for large files, but cannot pick a transfer up part way, so a retried upload starts that file over.
+
+    The queue file is shared by every Maya session on the machine.  Each session only uploads the items it owns,
+    and saves merge with the file under a lock, so sessions never upload the same item twice or lose each other's
+    items.
+
+    With a media index, a file whose exact content is already on another entity is not sent again.  Thumbnails and
+    filmstrips are shared from it, and a movie's entity is pointed at the Attachment that was uploaded before.
+    """
+    upload_progress = QtCore.Signal(dict)
+    upload_failed = QtCore.Signal(dict)
+
+    def __init__(self, path=None, connection=None, workers=2, media_index=None):
+        QtCore.QObject.__init__(self)
+        self.path = path
+        self.connection = connection
+        self.workers = workers
+        self.media_index = media_index
+        self.items = {}
+        self.done = 0
+        self.session = '%s.%s' % (os.getpid(), uuid.uuid4().hex[:8])
+        self._lock = threading.Lock()
+        self._ready = threading.Condition(self._lock)
+        self._threads = []
+        self._heartbeat = None
+        self._idle_callbacks = []
+        self._closed = False
+        # The queue lives on the main thread, so this is queued there and the tray is never touched from the
+        # upload threads.
+        self.upload_failed.connect(self._notify_failed)
+
+    def _notify_failed(self, item=None):
+        notify('Blaster', 'Uploading %s to Shotgun failed.' % item['name'])
+
+    def load(self):
+        """
+        :return: The queue file's items and the sessions that own them
+        """
+        store = {}
+        if self.path and os.path.exists(self.path):
+            try:
+                with open(self.path) as queue:
+                    store = json.load(queue)
+            except (IOError, ValueError), e:
+                logger.warning('Upload queue could not be read: %s' % e)
+        if 'items' not in store:
+            # Queue files from before sessions were tracked only hold items, which nobody owns any more.
+            store = {'items': store, 'sessions': {}}
+        return store
+
+    def save(self):
+        """
+        Writes this session's items over its own in the file, and takes over the items of sessions that have died.
+        Once the queue is closed, the session is taken out of the file instead, so its items are left to others.
+        Only call with the queue locked.
+        """
+        if not self.path:
+            return
+        directory = os.path.dirname(self.path)
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        with IndexLock('%s.lock' % self.path):
+            store = self.load()
+            now = time.time()
+            sessions = dict([(session, seen) for session, seen in store['sessions'].items()
+                             if now - seen < session_timeout])
+            if self._closed:
+                sessions.pop(self.session, None)
+            else:
+                sessions[self.session] = now
+            items = {}
+            claimed = 0
+            for item_id, item in store['items'].items():
+                if item.get('owner') == self.session:
+                    # Ours are written from memory, which has the uploads finished since.
+                    continue
+                if item.get('owner') in sessions or self._closed:
+                    items[item_id] = item
+                    continue
+                item['owner'] = self.session
+                item['status'] = 'Queued'
+                item['not_before'] = 0
+                self.items[item_id] = item
+                claimed += 1
+            items.update(self.items)
+            temp_path = '%s.%s.tmp' % (self.path, self.session)
+            with open(temp_path, 'w') as queue:
+                json.dump({'items': items, 'sessions': sessions}, queue)
+            if os.path.exists(self.path):
+                os.remove(self.path)
+            os.rename(temp_path, self.path)
+        if claimed:
+            logger.info('Taking over %i Shotgun uploads left by a closed Maya session.' % claimed)
+            self._ready.notify_all()
+
+    def _save(self):
+        try:
+            self.save()
+        except (IOError, OSError), e:
+            logger.warning('Upload queue could not be saved: %s' % e)
+
+    def resume(self):
+        """
+        Queues again everything left over from sessions that have closed, and keeps checking for more.
+        """
+        with self._lock:
+            self._save()
+        self._start()
+
+    def close(self):
+        """
+        Takes this session out of the queue file when Maya exits, so another session picks up what it didn't
+        finish straight away rather than after session_timeout.
+        """
+        with self._lock:
+            self._closed = True
+            self._save()
+
+    def add(self, entity_type=None, entity_id=None, path=None, field=None, kind='upload', name=None):
+        """
+        Queues a file for upload.
+
+        :param kind: upload to attach to field, thumbnail, or filmstrip
+        :return: The queued item's id
+        """
+        item_id = uuid.uuid4().hex
+        with self._lock:
+            self.items[item_id] = {
+                'id': item_id,
+                'entity_type': entity_type,
+                'entity_id': entity_id,
+                'path': path,
+                'field': field,
+                'kind': kind,
+                'name': name or os.path.basename(path),
+                'owner': self.session,
+                'attempts': 0,
+                'not_before': 0,
+                'status': 'Queued',
+                'time': time.time()
+            }
+            # Workers can finish with the item before add() returns, so it's reported from a copy.
+            queued = dict(self.items[item_id])
+            self._save()
+            self._ready.notify()
+        self._start()
+        self._emit(queued)
+        return item_id
+
+    def pending(self):
+        with self._lock:
+            return len(self.items)
+
+    def when_idle(self, callback=None):
+        """
+        Calls callback once nothing is left to upload, on the upload thread, or right away if that is already so.
+        """
+        with self._lock:
+            if self.items:
+                self._idle_callbacks.append(callback)
+                return
+        callback()
+
+    def _start(self):
+        self._threads = [thread for thread in self._threads if thread.is_alive()]
+        while len(self._threads) < self.workers:
+            thread = threading.Thread(target=self._run, name='BlasterUpload-%i' % len(self._threads))
+            thread.daemon = True
+            thread.start()
+            self._threads.append(thread)
+        if self._heartbeat is None:
+            self._heartbeat = threading.Thread(target=self._beat, name='BlasterUploadHeartbeat')
+            self._heartbeat.daemon = True
+            self._heartbeat.start()
+
+    def _beat(self):
+        # Long uploads can go minutes without a save, which would make this session look dead to the others.  Each
+        # save also takes over uploads that sessions closed since left behind.
+        while True:
+            time.sleep(heartbeat)
+            with self._lock:
+                if self._closed:
+                    return
+                self._save()
+
+    def _next(self):
+        with self._lock:
+            while True:
+                now = time.time()
+                waiting = [item for item in self.items.values() if item['status'] == 'Queued']
+                ready = [item for item in waiting if item['not_before'] <= now]
+                if ready:
+                    item = min(ready, key=lambda i: i['time'])
+                    item['status'] = 'Uploading'
+                    return dict(item)
+                if waiting:
+                    self._ready.wait(min([item['not_before'] for item in waiting]) - now)
+                else:
+                    self._ready.wait()
+
+    def _run(self):
+        while True:
+            item = self._next()
+            self._emit(item)
+            try:
+                self.upload(item)
+            except Exception, e:
+                self._failed(item, e)
+            else:
+                with self._lock:
+                    self.items.pop(item['id'], None)
+                    self.done += 1
+                    self._save()
+                item['status'] = 'Uploaded'
+                logger.info('Uploaded %s to %s %s.' % (item['name'], item['entity_type'], item['entity_id']))
+                self._emit(item)
+
+    def upload(self, item=None):
+        if not os.path.exists(item['path']):
+            raise IOError('%s no longer exists' % item['path'])
+        shotgun = self.connection()
+        slot = item['field'] or item['kind']
+        file_hash = None
+        if self.media_index:
+            file_hash = self.media_index.file_hash(item['path'])
+            known = self.media_index.lookup(file_hash, slot)
+            if known and self.link_existing(shotgun, item, known):
+                logger.info('%s is already on %s %s, linked it instead of uploading.' % (
+                    item['name'], known['entity_type'], known['entity_id']))
+                return
+            if known:
+                self.media_index.forget(file_hash, slot)
+        if item['kind'] == 'thumbnail':
+            shotgun.upload_thumbnail(item['entity_type'], item['entity_id'], item['path'])
+        elif item['kind'] == 'filmstrip':
+            shotgun.upload_filmstrip_thumbnail(item['entity_type'], item['entity_id'], item['path'])
+        else:
+            shotgun.upload(item['entity_type'], item['entity_id'], item['path'], item['field'])
+        if file_hash:
+            self.media_index.record(file_hash, slot, item['entity_type'], item['entity_id'])
+
+    def link_existing(self, shotgun=None, item=None, known=None):
+        """
+        Gives the item's entity media another entity already uploaded.  Thumbnails and filmstrips are shared, and a
+        file field is pointed at the other entity's Attachment, which is read back to make sure it took.
+        :return: False if the earlier upload is gone, or can't be linked
+        """
+        source = {'type': known['entity_type'], 'id': known['entity_id']}
+        if source['type'] == item['entity_type'] and source['id'] == item['entity_id']:
+            return True
+        try:
+            if item['kind'] in ['thumbnail', 'filmstrip']:
+                shotgun.share_thumbnail([{'type': item['entity_type'], 'id': item['entity_id']}],
+                                        source_entity=source, filmstrip_thumbnail=item['kind'] == 'filmstrip')
+                return True
+            existing = shotgun.find_one(source['type'], [['id', 'is', source['id']]], [item['field']])
+            attachment = existing and existing.get(item['field'])
+            # Only an uploaded file can be linked.  A web link or a local file path would not play in review.
+            if not attachment or attachment.get('link_type') != 'upload' or not attachment.get('id'):
+                return False
+            shotgun.update(item['entity_type'], item['entity_id'],
+                           {item['field']: {'type': 'Attachment', 'id': attachment['id']}})
+            linked = shotgun.find_one(item['entity_type'], [['id', 'is', item['entity_id']]], [item['field']])
+            return bool(linked and (linked.get(item['field']) or {}).get('id') == attachment['id'])
+        except Exception, e:
+            logger.debug('Could not link the %s of %s %s: %s' % (item['name'], source['type'], source['id'], e))
+            return False
+
+    def _failed(self, item=None, error=None):
+        item['attempts'] += 1
+        with self._lock:
+            if item['attempts'] >= max_attempts or not os.path.exists(item['path']):
+                self.items.pop(item['id'], None)
+                item['status'] = 'Failed'
+            else:
+                item['status'] = 'Queued'
+                item['not_before'] = time.time() + retry_delay * 2 ** (item['attempts'] - 1)
+                self.items[item['id']] = item
+                self._ready.notify()
+            self._save()
+        if item['status'] == 'Failed':
+            logger.error('Upload of %s failed for good: %s' % (item['name'], error))
+            self.upload_failed.emit(dict(item))
+        else:
+            logger.warning('Upload of %s failed, retrying (%i/%i): %s' % (item['name'], item['attempts'],
+                                                                         max_attempts, error))
+        self._emit(item)
+
+    def _emit(self, item=None):
+        with self._lock:
+            remaining = len(self.items)
+            idle_callbacks = [] if remaining else self._idle_callbacks
+            if not remaining:
+                self._idle_callbacks = []
+        summary = dict(item)
+        summary['remaining'] = remaining
+        summary['done'] = self.done
+        self.upload_progress.emit(summary)
+        for callback in idle_callbacks:
+            try:
+                callback()
+            except Exception, e:
+                logger.warning('Upload queue callback failed: %s' % e)
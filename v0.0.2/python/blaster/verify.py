@@ -0,0 +1,105 @@
+# Copyright (c) 2013 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+from multiprocessing.pool import ThreadPool
+import sgtk
+from sgtk.platform.qt import QtCore, QtGui
+from .sequence_index import file_sha1, list_frames
+
+logger = sgtk.platform.get_logger(__name__)
+
+# Frames are judged from a small decode, never at full size
+sample_size = 32
+verify_workers = 4
+# A frame darker than this mean, and flatter than this variance, on a 0-255 scale, is black
+black_mean = 2.0
+black_variance = 1.0
+# Problems that are only reported.  A black frame can be what the shot really looks like, a fade or a cut to black.
+warning_problems = ['black']
+
+
+def frame_stats(path=None):
+    """
+    Decodes a frame at sample size and measures it.
+    :return: dict of mean luminance and variance, or None if it can't be read
+    """
+    reader = QtGui.QImageReader(path)
+    reader.setScaledSize(QtCore.QSize(sample_size, sample_size))
+    image = reader.read()
+    if image.isNull():
+        return None
+    image = image.convertToFormat(QtGui.QImage.Format_RGB32)
+    values = []
+    for y in range(image.height()):
+        for x in range(image.width()):
+            values.append(QtGui.qGray(image.pixel(x, y)))
+    mean = sum(values) / float(len(values))
+    variance = sum([(value - mean) ** 2 for value in values]) / len(values)
+    return {'mean': mean, 'variance': variance}
+
+
+def stuck_frames(numbers=None, hashes=None):
+    """
+    Finds frames that repeat the one before them out of step with the rest of the sequence.
+
+    Repeats are grouped into runs of identical frames.  The most common run length is the sequence's own cadence,
+    2 for animation on twos.  A run exactly one frame longer than that is a stuck buffer, and its last frame is
+    returned.  Longer runs are holds and are left alone.
+    """
+    runs = []
+    for number in numbers:
+        if runs and number == runs[-1][-1] + 1 and hashes[number] == hashes[runs[-1][-1]]:
+            runs[-1].append(number)
+        else:
+            runs.append([number])
+    lengths = [len(run) for run in runs]
+    if len(lengths) < 3:
+        return []
+    cadence = max(sorted(set(lengths)), key=lengths.count)
+    return [run[-1] for run in runs if len(run) == cadence + 1]
+
+
+def verify_sequence(pattern=None, first=None, last=None, duplicates=False):
+    """
+    Checks every frame of a blast, in parallel.
+
+    Frames are bad when they are missing or can't be read, and black ones are reported as a warning.  With
+    duplicates, a frame whose file is byte for byte the same as the one before it, where the sequence's own cadence
+    says it should have moved on, is bad too.
+    :return: dict of frame number: problem for every bad frame
+    """
+    found = dict(list_frames(pattern))
+    problems = {}
+    for number in range(int(first), int(last) + 1):
+        if number not in found:
+            problems[number] = 'missing'
+    numbers = sorted([number for number in found if number is not None and first <= number <= last])
+    pool = ThreadPool(verify_workers)
+    try:
+        stats = dict(zip(numbers, pool.map(frame_stats, [found[number] for number in numbers])))
+        hashes = {}
+        if duplicates:
+            hashes = dict(zip(numbers, pool.map(file_sha1, [found[number] for number in numbers])))
+    finally:
+        pool.close()
+        pool.join()
+    for number in numbers:
+        frame = stats[number]
+        if frame is None:
+            problems[number] = 'unreadable'
+        elif frame['mean'] < black_mean and frame['variance'] < black_variance:
+            problems[number] = 'black'
+    if duplicates:
+        for number in stuck_frames([n for n in numbers if stats[n] is not None], hashes):
+            problems.setdefault(number, 'duplicate')
+    if problems:
+        logger.warning('%i bad frames in %s: %s' % (len(problems), pattern, ', '.join(
+            ['%s %s' % (number, problem) for number, problem in sorted(problems.items())])))
+    return problems
@@ -0,0 +1,158 @@
+# Copyright (c) 2013 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+Persistent headless Maya for farm blast tasks.
+
+Runs on the blast nodes, outside of Toolkit, so it only uses the standard library and Maya itself.
+
+Start the worker once per node with mayapy:
+    mayapy warm_worker.py serve --port 7450 --plugins AbcImport,mtoa
+
+Deadline tasks then hand their blast script to it:
+    python warm_worker.py send --port 7450 --script blaster_x.mel --proc blaster_x --start 1001 --end 1010
+                               --fallback "C:/Program Files/Autodesk/Maya2018/bin/mayabatch.exe"
+
+If no worker is listening, send runs the fallback mayabatch the old way, so a task never depends on the worker.
+"""
+
+import os
+import sys
+import json
+import socket
+import logging
+import argparse
+import subprocess
+
+logger = logging.getLogger('blaster.warm_worker')
+
+default_port = 7450
+host = '127.0.0.1'
+
+
+def client_arguments(port=None, script_path=None, proc=None, fallback=None, module_root=None):
+    """
+    Deadline CommandLine arguments for a task that goes through the warm worker.
+    :param module_root: Folder holding this script as the blast nodes see it.  Defaults to where it is here.
+    """
+    client = os.path.abspath(__file__).replace('.pyc', '.py')
+    if module_root:
+        client = os.path.join(module_root, os.path.basename(client))
+    return '"%s" send --port %s --script "%s" --proc %s --start <STARTFRAME> --end <ENDFRAME> --fallback "%s"' % (
+        client.replace('\\', '/'), port, script_path, proc, fallback)
+
+
+def _read_line(connection=None):
+    data = ''
+    while not data.endswith('\n'):
+        chunk = connection.recv(4096)
+        if not chunk:
+            break
+        data += chunk
+    return data.strip()
+
+
+def _reset_scene(cmds=None):
+    # A new scene drops the last job's nodes and references, but loaded plugins stay resident.
+    cmds.file(new=True, force=True)
+    cmds.flushUndo()
+
+
+def serve(port=default_port, plugins=None):
+    import maya.standalone
+    maya.standalone.initialize(name='python')
+    from maya import cmds, mel
+
+    for plugin in plugins or []:
+        try:
+            cmds.loadPlugin(plugin, quiet=True)
+        except RuntimeError, e:
+            logger.warning('Could not load %s: %s' % (plugin, e))
+
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    server.bind((host, port))
+    server.listen(1)
+    logger.info('Warm Maya worker listening on %s:%s' % (host, port))
+
+    while True:
+        connection, address = server.accept()
+        try:
+            request = json.loads(_read_line(connection))
+            logger.info('Blasting %(proc)s %(start)s-%(end)s' % request)
+            try:
+                mel.eval('source "%s";' % request['script'].replace('\\', '/'))
+                mel.eval('%s %i %i;' % (request['proc'], int(request['start']), int(request['end'])))
+                reply = {'ok': True}
+            except Exception, e:
+                reply = {'ok': False, 'error': '%s' % e}
+            finally:
+                _reset_scene(cmds)
+            connection.sendall(json.dumps(reply) + '\n')
+        except Exception, e:
+            logger.error('Bad request from %s: %s' % (address, e))
+        finally:
+            connection.close()
+
+
+def send(port=default_port, script=None, proc=None, start=None, end=None, fallback=None):
+    """
+    Hands one task to the local warm worker.
+    :return: Process exit code
+    """
+    request = {'script': script, 'proc': proc, 'start': start, 'end': end}
+    try:
+        connection = socket.create_connection((host, port), timeout=5)
+    except socket.error:
+        connection = None
+    if connection is None:
+        if not fallback:
+            logger.error('No warm worker on port %s and no fallback given.' % port)
+            return 1
+        logger.info('No warm worker on port %s, running %s' % (port, fallback))
+        return subprocess.call([fallback, '-script', script, '-command', '%s %s %s' % (proc, start, end)])
+    try:
+        # Blasts take as long as they take.
+        connection.settimeout(None)
+        connection.sendall(json.dumps(request) + '\n')
+        reply = json.loads(_read_line(connection) or '{}')
+    finally:
+        connection.close()
+    if not reply.get('ok'):
+        logger.error('Warm worker failed: %s' % reply.get('error'))
+        return 1
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Persistent headless Maya for Blaster farm tasks.')
+    sub = parser.add_subparsers(dest='mode')
+    serve_parser = sub.add_parser('serve')
+    serve_parser.add_argument('--port', type=int, default=default_port)
+    serve_parser.add_argument('--plugins', default='')
+    send_parser = sub.add_parser('send')
+    send_parser.add_argument('--port', type=int, default=default_port)
+    send_parser.add_argument('--script', required=True)
+    send_parser.add_argument('--proc', required=True)
+    send_parser.add_argument('--start', type=int, required=True)
+    send_parser.add_argument('--end', type=int, required=True)
+    send_parser.add_argument('--fallback', default=None)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(name)s: %(message)s')
+    if args.mode == 'serve':
+        serve(port=args.port, plugins=[p for p in args.plugins.split(',') if p])
+        return 0
+    return send(port=args.port, script=args.script, proc=args.proc, start=args.start, end=args.end,
+                fallback=args.fallback)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
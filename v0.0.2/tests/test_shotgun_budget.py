@@ -0,0 +1,151 @@
+# Copyright (c) 2013 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+Holds a Blaster run to the Shotgun call budget in info.yml.
+
+    mayapy -m unittest discover -s tests
+
+Drives the dialog's Shotgun code, the prefetch, the cache and the publish batch, against a fake connection and
+counts the calls through ShotgunMetrics, the same way a real run does.  Needs Toolkit's sgtk on the path.
+"""
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+app_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(app_root, 'python'))
+
+try:
+    import sgtk
+    from blaster.sg_cache import CachedShotgun
+    from blaster.sg_metrics import ShotgunMetrics
+    from blaster.sg_prefetch import ContextPrefetcher
+    from blaster.publish_batcher import PublishBatcher
+except ImportError, e:
+    raise unittest.SkipTest('Toolkit is not available: %s' % e)
+
+
+def load_budget():
+    try:
+        from tank_vendor import yaml
+    except ImportError:
+        import yaml
+    with open(os.path.join(app_root, 'info.yml')) as info:
+        return yaml.safe_load(info)['configuration']['shotgun_call_budget']['default_value']
+
+
+class FakeShotgun(object):
+    """
+    Answers the calls Blaster makes with made up records.
+    """
+
+    def __init__(self):
+        self.next_id = 100
+
+    def find_one(self, entity_type, filters, fields=None):
+        record = {'type': entity_type, 'id': filters[0][2]}
+        for field in fields or []:
+            record[field] = 1001 if field == 'sg_head_in' else 1100 if field == 'sg_tail_out' else field
+        return record
+
+    def find(self, entity_type, filters, fields=None):
+        return [self.find_one(entity_type, filters, fields)]
+
+    def create(self, entity_type, data):
+        self.next_id += 1
+        return dict(data, type=entity_type, id=self.next_id)
+
+    def update(self, entity_type, entity_id, data):
+        return dict(data, type=entity_type, id=entity_id)
+
+    def batch(self, requests):
+        results = []
+        for request in requests:
+            if request['request_type'] == 'create':
+                results.append(self.create(request['entity_type'], request['data']))
+            else:
+                results.append(self.update(request['entity_type'], request['entity_id'], request['data']))
+        return results
+
+
+class FakeUploads(object):
+    def __init__(self):
+        self.added = []
+
+    def add(self, entity_type, entity_id, path, field=None, kind='upload'):
+        self.added.append((entity_type, entity_id, path, field, kind))
+
+
+class ShotgunBudgetTest(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.cache_path = os.path.join(self.root, 'shotgun_cache.json')
+        self.fake = FakeShotgun()
+        self.budget = load_budget()
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def run_blaster(self, metrics=None, uploads=None):
+        """
+        Opens the dialog, blasts a Shot with a movie and a sequence, and publishes the staged copy afterwards.
+        """
+        shotgun = CachedShotgun(connection=lambda: metrics.wrap(self.fake), path=self.cache_path)
+        prefetched = ContextPrefetcher(connection=lambda: shotgun, user_id=42, entity_type='Shot',
+                                       entity_id=7).start().result()
+        self.assertEqual(prefetched['entity']['sg_head_in'], 1001)
+
+        publisher = PublishBatcher(shotgun=shotgun, uploads=uploads)
+        movie = publisher.create('Version', {'code': 'shot_v001'},
+                                 uploads=[{'path': '/tmp/shot_v001.mov', 'field': 'sg_uploaded_movie'}])
+        publisher.create('Version', {'code': 'shot_v001_frames'},
+                         uploads=[{'path': '/tmp/shot_v001.1001.jpg', 'kind': 'thumbnail'}])
+        publisher.commit()
+        self.assertEqual(movie['type'], 'Version')
+
+        staged = PublishBatcher(shotgun=shotgun, uploads=uploads)
+        staged.create('Version', {'code': 'shot_v001_staged'})
+        staged.commit()
+        shotgun.flush()
+        return shotgun
+
+    def test_run_within_budget(self):
+        metrics = ShotgunMetrics()
+        uploads = FakeUploads()
+        self.run_blaster(metrics, uploads)
+        self.assertEqual(metrics.over_budget(self.budget), {})
+        self.assertEqual(metrics.methods['find_one']['calls'], 2)
+        self.assertEqual(metrics.methods['batch']['calls'], 2)
+        self.assertNotIn('create', metrics.methods)
+        self.assertEqual(len(uploads.added), 2)
+
+    def test_reopening_reads_from_cache(self):
+        self.run_blaster(ShotgunMetrics(), FakeUploads())
+        metrics = ShotgunMetrics()
+        shotgun = self.run_blaster(metrics, FakeUploads())
+        # The user and the Shot were cached by the first run, the Versions it wrote don't touch them.
+        self.assertNotIn('find_one', metrics.methods)
+        self.assertEqual(shotgun.stats()['hits'], 2)
+        self.assertEqual(metrics.over_budget(self.budget), {})
+
+    def test_over_budget_is_reported(self):
+        metrics = ShotgunMetrics()
+        connection = metrics.wrap(self.fake)
+        for _ in range(self.budget['batch'] + 1):
+            connection.batch([{'request_type': 'create', 'entity_type': 'Version', 'data': {}}])
+        self.assertEqual(metrics.over_budget(self.budget), {'batch': (self.budget['batch'] + 1, self.budget['batch'])})
+
+
+if __name__ == '__main__':
+    unittest.main()